@@ -1,6 +1,11 @@
 from abc import ABC, abstractmethod
 
+import numpy as np
+
+
 class Dataset(ABC):
+    __intrinsics_by_type: dict[type, "DatasetIntrinsics"] = {}
+
     @property
     @abstractmethod
     def laser_count(self) -> int:
@@ -29,4 +34,33 @@ class Dataset(ABC):
     @property
     @abstractmethod
     def h_resolutions(self) -> list[float]:
-        pass
\ No newline at end of file
+        pass
+
+    @property
+    def intrinsics(self) -> "DatasetIntrinsics":
+        dataset_type = type(self)
+        if dataset_type not in Dataset.__intrinsics_by_type:
+            Dataset.__intrinsics_by_type[dataset_type] = DatasetIntrinsics(self)
+
+        return Dataset.__intrinsics_by_type[dataset_type]
+
+
+class DatasetIntrinsics:
+    def __init__(self, dataset: Dataset):
+        self.v_angles = read_only_array(dataset.v_angles)
+        self.v_offsets = read_only_array(dataset.v_offsets)
+        self.h_offsets = read_only_array(dataset.h_offsets)
+        self.h_resolutions = read_only_array(dataset.h_resolutions)
+
+        assert np.all(np.diff(self.v_angles) > 0), "v_angles are not in ascending order"
+        assert len(self.v_offsets) == len(self.v_angles), "v_offsets and v_angles have different lengths"
+
+        self.theta_steps = read_only_array(2 * np.pi / self.h_resolutions)
+        self.v_offset_bounds = (float(np.min(self.v_offsets)), float(np.max(self.v_offsets)))
+
+
+def read_only_array(values) -> np.ndarray:
+    array = np.array(values)
+    array.flags.writeable = False
+
+    return array
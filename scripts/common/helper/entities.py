@@ -2,18 +2,18 @@ from typing import Union
 from scripts.common.helper.orm import OrmEntity, SQLExpr
 
 
-class DatasetEntity(OrmEntity, table_name="dataset"):
+class DatasetEntity(OrmEntity, table_name="dataset", indexes=(("name",),)):
     id: int | None
     name: str
     laser_count: int
     max_range: float
 
-class DatasetFrame(OrmEntity, table_name="dataset_frame"):
+class DatasetFrame(OrmEntity, table_name="dataset_frame", indexes=(("dataset_id",), ("relative_path",))):
     id: int | None
     dataset_id: int
     relative_path: str
 
-class DatasetLaserGt(OrmEntity, table_name="dataset_laser_gt"):
+class DatasetLaserGt(OrmEntity, table_name="dataset_laser_gt", indexes=(("dataset_id",),)):
     id: int | None
     dataset_id: int
     laser_idx: int
@@ -23,13 +23,16 @@ class DatasetLaserGt(OrmEntity, table_name="dataset_laser_gt"):
     horizontal_resolution: float
     horizontal_angle_offset: float
 
-class DatasetFrameGt(OrmEntity, table_name="dataset_frame_gt"):
+class DatasetFrameGt(OrmEntity, table_name="dataset_frame_gt", indexes=(("dataset_frame_id",),)):
     id: int | None
     dataset_frame_id: int
     points_count: int
     scanlines_count: int
 
-class DatasetFrameScanlineGt(OrmEntity, table_name="dataset_frame_scanline_gt"):
+class DatasetFrameScanlineGt(
+    OrmEntity, table_name="dataset_frame_scanline_gt",
+    indexes=(("dataset_frame_id",), ("points_count", "dataset_frame_id"))
+):
     id: int | None
     dataset_frame_id: int
     laser_id: int
@@ -55,7 +58,10 @@ class IntrinsicsExperiment(OrmEntity, table_name="intrinsics_experiment"):
             self.use_horizontal_heuristics
         )
 
-class IntrinsicsFrameResult(OrmEntity, table_name="intrinsics_frame_result"):
+class IntrinsicsFrameResult(
+    OrmEntity, table_name="intrinsics_frame_result",
+    indexes=(("experiment_id",), ("dataset_frame_id",), ("experiment_id", "dataset_frame_id"))
+):
     id: int | None
     experiment_id: int
     dataset_frame_id: int
@@ -65,7 +71,10 @@ class IntrinsicsFrameResult(OrmEntity, table_name="intrinsics_frame_result"):
     unassigned_points: int
     end_reason: str
 
-class IntrinsicsScanlineResult(OrmEntity, table_name="intrinsics_scanline_result"):
+class IntrinsicsScanlineResult(
+    OrmEntity, table_name="intrinsics_scanline_result",
+    indexes=(("intrinsics_result_id",), ("intrinsics_result_id", "scanline_idx"))
+):
     id: int | None
     intrinsics_result_id: int
     scanline_idx: int
@@ -96,7 +105,10 @@ class RangeImageExperiment(OrmEntity, table_name="ri_experiment"):
     description: str
     commit_hash: str
 
-class RangeImageFrameResult(OrmEntity, table_name="ri_frame_result"):
+class RangeImageFrameResult(
+    OrmEntity, table_name="ri_frame_result",
+    indexes=(("experiment_id",), ("dataset_frame_id",), ("experiment_id", "dataset_frame_id"))
+):
     id: int | None
     experiment_id: int
     dataset_frame_id: int
@@ -117,7 +129,10 @@ class CompressionExperiment(OrmEntity, table_name="compression_experiment"):
     description: str
     commit_hash: str
 
-class CompressionFrameResult(OrmEntity, table_name="compression_frame_result"):
+class CompressionFrameResult(
+    OrmEntity, table_name="compression_frame_result",
+    indexes=(("experiment_id",), ("dataset_frame_id",), ("experiment_id", "dataset_frame_id"))
+):
     id: int | None
     experiment_id: int
     dataset_frame_id: int
@@ -139,3 +154,19 @@ class CompressionFrameResult(OrmEntity, table_name="compression_frame_result"):
     original_to_naive_rmse: float
     accurate_to_original_rmse: float
     original_to_accurate_rmse: float
+
+class MergeManifestEntry(OrmEntity, table_name="merge_manifest", indexes=(("merge_type", "part_hash"),)):
+    id: int | None
+    timestamp: Union[int, SQLExpr]
+    merge_type: str
+    experiment_id: int
+    part_path: str
+    part_size: int
+    part_mtime: int
+    part_hash: str
+
+class FrameRobustness(OrmEntity, table_name="frame_robustness", indexes=(("threshold", "dataset_frame_id", "robust"),)):
+    id: int | None
+    dataset_frame_id: int
+    threshold: int
+    robust: bool
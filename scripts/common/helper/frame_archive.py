@@ -0,0 +1,139 @@
+import fnmatch
+import glob
+import json
+import os
+
+import numpy as np
+
+from scripts.common.helper.point_cloud import MappedFrame, load_binary, map_binary
+
+
+class FrameArchive:
+    DATA_SUFFIX = ".frames"
+    INDEX_SUFFIX = ".index.json"
+
+    def __init__(self, data_path: str):
+        self.data_path = data_path
+        self._data = None
+
+        with open(data_path + FrameArchive.INDEX_SUFFIX) as f:
+            self.index: dict[str, tuple[int, int]] = {path: tuple(entry) for path, entry in json.load(f).items()}
+
+    @property
+    def data(self) -> np.ndarray:
+        # a single read-only mapping per archive, shared by every frame of the sequence
+        if self._data is None:
+            self._data = np.memmap(self.data_path, dtype=np.float32, mode="r").reshape((-1, 4))
+
+        return self._data
+
+    def __contains__(self, relative_path: str) -> bool:
+        return relative_path in self.index
+
+    def map(self, relative_path: str) -> MappedFrame:
+        start, count = self.index[relative_path]
+        return MappedFrame(self.data[start:start + count])
+
+    def load(self, relative_path: str):
+        frame = self.map(relative_path)
+        return frame.points, frame.intensity
+
+    @staticmethod
+    def sequence_name(relative_path: str) -> str:
+        return os.path.dirname(relative_path).replace("/", "__")
+
+    @staticmethod
+    def pack(data_path: str, dataset_root: str, relative_paths: list[str]):
+        index = {}
+        rows_written = 0
+        tmp_data_path = data_path + ".tmp"
+        tmp_index_path = data_path + FrameArchive.INDEX_SUFFIX + ".tmp"
+
+        with open(tmp_data_path, "wb") as out:
+            for relative_path in sorted(relative_paths):
+                data = np.fromfile(os.path.join(dataset_root, relative_path), dtype=np.float32).reshape((-1, 4))
+                data.tofile(out)
+                index[relative_path] = (rows_written, data.shape[0])
+                rows_written += data.shape[0]
+
+        with open(tmp_index_path, "w") as f:
+            json.dump(index, f)
+
+        os.replace(tmp_data_path, data_path)
+        os.replace(tmp_index_path, data_path + FrameArchive.INDEX_SUFFIX)
+
+        return rows_written
+
+
+class FrameSource:
+    def __init__(self, dataset_root: str, archive_dir: str | None = None):
+        self.dataset_root = dataset_root
+        self.archive_dir = archive_dir if archive_dir and os.path.isdir(archive_dir) else None
+        self._archives: dict[str, FrameArchive | None] = {}
+
+    def path(self, relative_path: str) -> str:
+        return os.path.join(self.dataset_root, relative_path)
+
+    def map(self, relative_path: str) -> MappedFrame:
+        archive = self.__archive_for(relative_path)
+        if archive is not None and relative_path in archive:
+            return archive.map(relative_path)
+
+        return map_binary(self.path(relative_path))
+
+    def load(self, relative_path: str, mmap=False):
+        if mmap or self.is_archived(relative_path):
+            frame = self.map(relative_path)
+            return frame.points, frame.intensity
+
+        return load_binary(self.path(relative_path))
+
+    def load_points(self, relative_path: str, mmap=False):
+        # mapped frames never mask (nor copy) the intensity the caller does not need
+        if mmap or self.is_archived(relative_path):
+            return self.map(relative_path).points
+
+        points, _ = load_binary(self.path(relative_path))
+        return points
+
+    def load_path(self, frame_path: str, mmap=False):
+        return self.load(os.path.relpath(frame_path, self.dataset_root), mmap=mmap)
+
+    def load_path_points(self, frame_path: str, mmap=False):
+        return self.load_points(os.path.relpath(frame_path, self.dataset_root), mmap=mmap)
+
+    def is_archived(self, relative_path: str) -> bool:
+        archive = self.__archive_for(relative_path)
+        return archive is not None and relative_path in archive
+
+    def relative_paths(self, frames_glob: str) -> list[str]:
+        if self.archive_dir is None:
+            frames_paths = glob.glob(os.path.join(self.dataset_root, frames_glob))
+            return [os.path.relpath(path, self.dataset_root) for path in frames_paths]
+
+        index_paths = glob.glob(os.path.join(self.archive_dir, "*" + FrameArchive.DATA_SUFFIX + FrameArchive.INDEX_SUFFIX))
+        relative_paths = []
+        for index_path in sorted(index_paths):
+            archive = self.__archive_from_data_path(index_path[:-len(FrameArchive.INDEX_SUFFIX)])
+            relative_paths.extend(path for path in archive.index.keys() if fnmatch.fnmatch(path, frames_glob))
+
+        return relative_paths
+
+    def __archive_for(self, relative_path: str) -> FrameArchive | None:
+        if self.archive_dir is None:
+            return None
+
+        sequence_name = FrameArchive.sequence_name(relative_path)
+        if sequence_name not in self._archives:
+            data_path = os.path.join(self.archive_dir, sequence_name + FrameArchive.DATA_SUFFIX)
+            exists = os.path.exists(data_path + FrameArchive.INDEX_SUFFIX)
+            self._archives[sequence_name] = FrameArchive(data_path) if exists else None
+
+        return self._archives[sequence_name]
+
+    def __archive_from_data_path(self, data_path: str) -> FrameArchive:
+        sequence_name = os.path.basename(data_path)[:-len(FrameArchive.DATA_SUFFIX)]
+        if self._archives.get(sequence_name) is None:
+            self._archives[sequence_name] = FrameArchive(data_path)
+
+        return self._archives[sequence_name]
@@ -0,0 +1,36 @@
+from scripts.common.helper.entities import FrameRobustness
+from scripts.common.helper.orm import Database
+
+ROBUST_POINT_COUNT_THRESHOLD = 64
+
+
+def build_frame_robustness(db: Database, thresholds: list[int] | None = None):
+    # rebuilds the given thresholds (by default the ones already built plus the paper one) from the ground truth
+    FrameRobustness.create_table(db)
+    if thresholds is None:
+        built_thresholds = [row[0] for row in db.execute("SELECT DISTINCT threshold FROM frame_robustness")]
+        thresholds = sorted(set(built_thresholds) | {ROBUST_POINT_COUNT_THRESHOLD})
+
+    # a frame is robust when none of its ground truth scanlines has fewer points than the threshold
+    query = """
+        INSERT INTO frame_robustness (dataset_frame_id, threshold, robust)
+        SELECT df.id,
+               ?,
+               NOT EXISTS (
+                   SELECT 1
+                   FROM dataset_frame_scanline_gt scanline_gt
+                   WHERE scanline_gt.dataset_frame_id = df.id AND scanline_gt.points_count < ?
+               )
+        FROM dataset_frame df
+        ORDER BY df.id
+    """
+
+    with db.transaction():
+        for threshold in thresholds:
+            db.execute("DELETE FROM frame_robustness WHERE threshold = ?", (threshold,))
+            db.execute(query, (threshold, threshold))
+
+
+def ensure_frame_robustness(db: Database, threshold: int = ROBUST_POINT_COUNT_THRESHOLD):
+    if not db.table_exists(FrameRobustness.__table__) or FrameRobustness.one(db, "threshold = ?", (threshold,)) is None:
+        build_frame_robustness(db, [threshold])
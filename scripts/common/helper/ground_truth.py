@@ -1,57 +1,44 @@
 from scripts.common.helper.point_cloud import *
+from scripts.common.helper.datasets.base import DatasetIntrinsics
 
-def compute_ground_truth(points, v_angles, v_offsets, h_offsets, h_resolutions, threshold=5e-4):
-    assert np.all(np.diff(v_angles) > 0), "v_angles are not in ascending order"
-    assert len(v_offsets) == len(v_angles), "v_offsets and v_angles have different lengths"
-
+def compute_ground_truth(points, intrinsics: DatasetIntrinsics, threshold=5e-4):
     phis = calculate_phi(points)
     thetas = calculate_theta(points)
     ranges = calculate_range(points)
     ranges_xy = calculate_range_xy(points)
-    scanlines_ids = np.full(len(points), -1, dtype=int)
-    theta_offsets = {}
-
-    laser_idx = 0
-    while laser_idx < len(v_offsets):
-        v = v_offsets[laser_idx]
-        phi_correction = np.arcsin(v / ranges)
-
-        # find indices where correction was successful and phi is equal to the corresponding v_angle +- 1e-3
-        idx = np.where(np.abs(phis - phi_correction - v_angles[laser_idx]) < threshold)[0]
-
-        if len(idx) == 0:
-            laser_idx += 1
-            continue
 
-        assert np.all(scanlines_ids[idx] == -1), "Some points were assigned to multiple scanlines"
+    point_indices, laser_indices = candidate_scanlines(phis, ranges, intrinsics, threshold)
 
-        # assign scanline id to the corresponding indices
-        scanlines_ids[idx] = laser_idx
+    # same test as matching each laser separately: phi equals the corresponding v_angle +- threshold after correction.
+    # The intrinsics are cast to the dtype of the points, as the scalars of the per-laser loop were, so a float32 cloud
+    # is still tested in float32
+    v_offsets = intrinsics.v_offsets[laser_indices].astype(ranges.dtype)
+    v_angles = intrinsics.v_angles[laser_indices].astype(phis.dtype)
+    phi_corrections = np.arcsin(v_offsets / ranges[point_indices])
+    matches = np.abs(phis[point_indices] - phi_corrections - v_angles) < threshold
+    point_indices, laser_indices = point_indices[matches], laser_indices[matches]
 
-        # compute diff to ideal and theta offset
-        h = h_offsets[laser_idx]
-        theta_step = 2 * np.pi / h_resolutions[laser_idx]
-        corrected_thetas = thetas[idx] - np.arcsin(h / ranges_xy[idx])
-        ideal_thetas = np.floor(corrected_thetas / theta_step) * theta_step
-        theta_offsets[laser_idx] = float(np.mean(corrected_thetas - ideal_thetas))
+    assert np.all(np.diff(point_indices) > 0), "Some points were assigned to multiple scanlines"
 
-        laser_idx += 1
+    scanlines_ids = np.full(len(points), -1, dtype=int)
+    scanlines_ids[point_indices] = laser_indices
 
     assert np.all(scanlines_ids != -1), "Some points were not assigned to any scanline"
 
+    theta_offsets = compute_theta_offsets(scanlines_ids, thetas, ranges_xy, intrinsics)
+    laser_ids, points_counts = np.unique(scanlines_ids, return_counts=True)
+
     result = {
         'points_count': len(points),
-        'scanlines_count': np.unique(scanlines_ids).shape[0],
+        'scanlines_count': laser_ids.shape[0],
         'scanlines': []
     }
 
-    for laser_idx in np.unique(scanlines_ids):
-        v_offset = v_offsets[laser_idx]
-        v_angle = v_angles[laser_idx]
-        h_offset = h_offsets[laser_idx]
-        h_resolution = h_resolutions[laser_idx]
-
-        points_count = int(np.sum(scanlines_ids == laser_idx))
+    for laser_idx, points_count in zip(laser_ids, points_counts):
+        v_offset = intrinsics.v_offsets[laser_idx].item()
+        v_angle = intrinsics.v_angles[laser_idx].item()
+        h_offset = intrinsics.h_offsets[laser_idx].item()
+        h_resolution = intrinsics.h_resolutions[laser_idx].item()
 
         result['scanlines'].append({
             'laser_idx': int(laser_idx),
@@ -60,7 +47,47 @@ def compute_ground_truth(points, v_angles, v_offsets, h_offsets, h_resolutions,
             'h_offset': h_offset,
             'h_resolution': h_resolution,
             'theta_offset': theta_offsets[laser_idx],
-            'points_count': points_count
+            'points_count': int(points_count)
         })
 
     return scanlines_ids, result
+
+
+def candidate_scanlines(phis, ranges, intrinsics: DatasetIntrinsics, threshold):
+    # the correction arcsin(v / r) is monotonic in v, so every matching laser has its v_angle within these bounds
+    min_v_offset, max_v_offset = intrinsics.v_offset_bounds
+    min_corrections = np.arcsin(np.clip(min_v_offset / ranges, -1, 1))
+    max_corrections = np.arcsin(np.clip(max_v_offset / ranges, -1, 1))
+
+    # the bounds are widened by another threshold so rounding never drops a matching laser
+    first = np.searchsorted(intrinsics.v_angles, phis - max_corrections - 2 * threshold, side="left")
+    last = np.searchsorted(intrinsics.v_angles, phis - min_corrections + 2 * threshold, side="right")
+    counts = np.maximum(last - first, 0)
+
+    point_indices = np.repeat(np.arange(phis.shape[0]), counts)
+    group_starts = np.cumsum(counts) - counts
+    laser_indices = np.repeat(first, counts) + np.arange(point_indices.shape[0]) - np.repeat(group_starts, counts)
+
+    return point_indices, laser_indices
+
+
+def compute_theta_offsets(scanlines_ids, thetas, ranges_xy, intrinsics: DatasetIntrinsics):
+    # points grouped by scanline keep their original order, so each mean is taken over the same sequence as before
+    order = np.argsort(scanlines_ids, kind="stable")
+    sorted_ids = scanlines_ids[order]
+
+    # cast to the dtype of the points like in compute_ground_truth
+    h_offsets = intrinsics.h_offsets[sorted_ids].astype(ranges_xy.dtype)
+    theta_steps = intrinsics.theta_steps[sorted_ids].astype(thetas.dtype)
+
+    corrected_thetas = thetas[order] - np.arcsin(h_offsets / ranges_xy[order])
+    ideal_thetas = np.floor(corrected_thetas / theta_steps) * theta_steps
+    theta_diffs = corrected_thetas - ideal_thetas
+
+    laser_ids, group_starts = np.unique(sorted_ids, return_index=True)
+    group_ends = np.append(group_starts[1:], sorted_ids.shape[0])
+
+    return {
+        int(laser_idx): float(np.mean(theta_diffs[start:end]))
+        for laser_idx, start, end in zip(laser_ids, group_starts, group_ends)
+    }
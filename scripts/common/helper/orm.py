@@ -1,8 +1,23 @@
 import sqlite3
-from typing import TypeVar
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import chain
+from operator import attrgetter
+from typing import Iterator, TypeVar
+
+import numpy as np
 
 EntityType = TypeVar("EntityType", bound="OrmEntity")
 
+DEFAULT_CHUNK_SIZE = 10000
+
+# per connection settings, they are not stored in the database file
+CONNECTION_PRAGMAS = {
+    "cache_size": -262144,  # KiB, 256 MiB
+    "mmap_size": 1 << 30,
+    "temp_store": "MEMORY",
+}
+
 class SQLExpr:
     def __init__(self, expr: str):
         self.expr = expr
@@ -11,10 +26,32 @@ class SQLExpr:
         return f"SQLExpr({self.expr!r})"
 
 
+def connect(db_path: str, **kwargs) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, **kwargs)
+    for name, value in CONNECTION_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+    return conn
+
+
+def fetch_chunks(db: "Database", query: str, params: tuple, chunk_size: int, build_chunk) -> Iterator:
+    cur = db.conn.cursor()
+    cur.row_factory = None
+    try:
+        cur.execute(query, params)
+        while rows := cur.fetchmany(chunk_size):
+            yield build_chunk(rows)
+    finally:
+        cur.close()
+
+
 class Database:
     def __init__(self, db_path: str):
-        self.conn = sqlite3.connect(db_path)
+        self.conn = connect(db_path)
         self.conn.row_factory = sqlite3.Row
+        self.__transaction_depth = 0
+        self.__commit_every = None
+        self.__pending_statements = 0
 
     def __enter__(self):
         return self
@@ -25,29 +62,94 @@ class Database:
     def execute(self, query: str, params: tuple = ()):
         cur = self.conn.cursor()
         cur.execute(query, params)
-        self.conn.commit()
+        self.__statement_done()
         return cur
 
     def executemany(self, query: str, seq_of_params: list[tuple]):
         cur = self.conn.cursor()
         cur.executemany(query, seq_of_params)
-        self.conn.commit()
+        self.__statement_done()
         return cur
 
+    @contextmanager
+    def transaction(self, commit_every: int | None = None):
+        # commits are deferred until the block exits (or every commit_every statements), nested blocks join the
+        # outermost one and an exception rolls back whatever was not committed yet
+        outermost = self.__transaction_depth == 0
+        if outermost:
+            self.__commit_every = commit_every
+            self.__pending_statements = 0
+
+        self.__transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            if outermost:
+                self.conn.rollback()
+            raise
+        else:
+            if outermost:
+                self.conn.commit()
+        finally:
+            self.__transaction_depth -= 1
+
+    def apply_pragmas(self, pragmas: dict):
+        for name, value in pragmas.items():
+            self.execute(f"PRAGMA {name} = {value}")
+
+    def table_exists(self, table_name: str) -> bool:
+        query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+        return self.execute(query, (table_name,)).fetchone() is not None
+
+    @contextmanager
+    def attached(self, db_path: str, schema: str):
+        # sqlite refuses to attach or detach while a transaction is open, so open transactions inside this block
+        self.execute(f"ATTACH DATABASE ? AS {schema}", (db_path,))
+        try:
+            yield self
+        finally:
+            self.execute(f"DETACH DATABASE {schema}")
+
     def close(self):
         self.conn.close()
 
+    def __statement_done(self):
+        if self.__transaction_depth == 0:
+            self.conn.commit()
+            return
+
+        self.__pending_statements += 1
+        if self.__commit_every is not None and self.__pending_statements >= self.__commit_every:
+            self.conn.commit()
+            self.__pending_statements = 0
+
+
+class OrmEntityMeta(type):
+    # entities only ever hold their annotated columns, so they get __slots__ instead of a per-instance __dict__
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        if "table_name" in kwargs and "__slots__" not in namespace:
+            namespace["__slots__"] = tuple(namespace.get("__annotations__", {}))
 
-class OrmEntity:
+        return super().__new__(mcs, name, bases, namespace, **kwargs)
+
+
+class OrmEntity(metaclass=OrmEntityMeta):
+    __slots__ = ()
     __table__: str
     id: int | None
 
-    def __init_subclass__(cls, table_name: str, **kwargs):
+    def __init_subclass__(cls, table_name: str, indexes: tuple[tuple[str, ...], ...] = (), **kwargs):
         super().__init_subclass__(**kwargs)
         cls.__table__ = table_name
+        cls.__indexes__ = indexes
         cls.__fields__ = [
             field for field in cls.__annotations__.keys() if field != "id"
         ]
+        cls.__row_type__ = namedtuple(f"{cls.__name__}Row", ["id"] + cls.__fields__)
+        # id is the rowid, so it is never NULL once read even though it is optional before saving
+        cls.__dtype__ = np.dtype([("id", np.int64)] + [
+            (field, cls._map_python_type_to_numpy(cls.__annotations__[field])) for field in cls.__fields__
+        ])
 
     def __init__(self, **kwargs):
         for field in self.__annotations__.keys():
@@ -63,6 +165,16 @@ class OrmEntity:
         }
         return mapping.get(py_type, "TEXT")
 
+    @classmethod
+    def _map_python_type_to_numpy(cls, py_type: type) -> np.dtype:
+        mapping = {
+            int: np.int64,
+            int | None: np.float64,  # NULL is read as NaN, int64 has no missing value
+            float: np.float64,
+            bool: np.bool_,
+        }
+        return np.dtype(mapping.get(py_type, object))
+
     @classmethod
     def create_table(cls, db: Database):
         fields_sql = []
@@ -73,6 +185,33 @@ class OrmEntity:
                 sql_type = cls._map_python_type_to_sql(field_type)
                 fields_sql.append(f"{field} {sql_type}")
         db.execute(f"CREATE TABLE IF NOT EXISTS {cls.__table__} ({', '.join(fields_sql)})")
+        cls.create_indexes(db)
+
+    @classmethod
+    def add_missing_columns(cls, db: Database):
+        # tables created before a field was added get it as a NULL column, CREATE TABLE IF NOT EXISTS does not
+        existing_columns = {row[1] for row in db.execute(f"PRAGMA table_info({cls.__table__})")}
+        for field in cls.__fields__:
+            if field not in existing_columns:
+                sql_type = cls._map_python_type_to_sql(cls.__annotations__[field])
+                db.execute(f"ALTER TABLE {cls.__table__} ADD COLUMN {field} {sql_type}")
+
+    @classmethod
+    def create_indexes(cls, db: Database):
+        # named like the ones in experiments_db.sql, so existing databases do not get duplicates
+        for columns in cls.__indexes__:
+            index_name = f"{cls.__table__}_{'_'.join(columns)}_idx"
+            db.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {cls.__table__} ({', '.join(columns)})")
+
+    @classmethod
+    def __build_array(cls, rows: list[tuple]) -> np.ndarray:
+        try:
+            return np.array(rows, dtype=cls.__dtype__)
+        except TypeError as e:
+            raise ValueError(
+                f"{cls.__table__} has NULL values in a column declared as int, declare it as int | None to read it "
+                f"as float64 with NaN in projection='array'"
+            ) from e
 
     def save(self, db: Database) -> int:
         if getattr(self, "id", None) is None:
@@ -88,9 +227,7 @@ class OrmEntity:
                     params.append(val)
 
             sql = f"INSERT INTO {self.__table__} ({', '.join(field_names)}) VALUES ({', '.join(placeholders)})"
-            db.execute(sql, tuple(params))
-
-            self.id = db.execute("SELECT last_insert_rowid()").fetchone()[0]
+            self.id = db.execute(sql, tuple(params)).lastrowid
         else:
             set_clause_parts, params = [], []
 
@@ -141,6 +278,37 @@ class OrmEntity:
         row = db.execute(query, params).fetchone()
         return cls(**row) if row else None
 
+    @classmethod
+    def iter_all(cls: type[EntityType], db: Database, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 projection: str | None = None) -> Iterator[EntityType | tuple]:
+        return cls.iter_where(db, "1", (), chunk_size, projection)
+
+    @classmethod
+    def iter_where(cls: type[EntityType], db: Database, condition: str, params: tuple = (),
+                   chunk_size: int = DEFAULT_CHUNK_SIZE, projection: str | None = None) -> Iterator[EntityType | tuple]:
+        # not a generator itself, so invalid arguments raise on the call rather than on the first next()
+        if projection == "array":
+            raise ValueError("Structured arrays are only produced per chunk, use iter_chunks instead.")
+
+        return chain.from_iterable(cls.iter_chunks(db, condition, params, chunk_size, projection))
+
+    @classmethod
+    def iter_chunks(cls: type[EntityType], db: Database, condition: str = "1", params: tuple = (),
+                    chunk_size: int = DEFAULT_CHUNK_SIZE, projection: str | None = None) -> Iterator[list | np.ndarray]:
+        # projection: None builds entities, "tuple" named tuples and "array" one numpy structured array per chunk
+        columns = ["id"] + cls.__fields__
+        if projection is None:
+            build_chunk = lambda rows: [cls(**dict(zip(columns, row))) for row in rows]
+        elif projection == "tuple":
+            build_chunk = lambda rows: [cls.__row_type__._make(row) for row in rows]
+        elif projection == "array":
+            build_chunk = cls.__build_array
+        else:
+            raise ValueError(f"Unknown projection: {projection}")
+
+        query = f"SELECT {', '.join(columns)} FROM {cls.__table__} WHERE {condition}"
+        return fetch_chunks(db, query, params, chunk_size, build_chunk)
+
     @classmethod
     def save_all(cls: type[EntityType], db: Database, objects: list[EntityType]):
         if not objects:
@@ -166,18 +334,20 @@ class OrmEntity:
 
         sql = f"INSERT INTO {cls.__table__} ({', '.join(field_names)}) VALUES ({', '.join(placeholders)})"
 
-        values = []
+        param_fields = [f for f, mode in zip(field_names, expr_mode) if mode == "param"]
+        expr_fields = [f for f, mode in zip(field_names, expr_mode) if mode == "expr"]
+
         for obj in objects:
-            row_params = []
-            for f, mode in zip(field_names, expr_mode):
-                val = getattr(obj, f)
-                if mode == "param":
-                    row_params.append(val)
-                elif mode == "expr":
-                    if not isinstance(val, SQLExpr):
-                        raise ValueError(f"Field {f} must be SQLExpr in all rows when using save_all.")
-
-            values.append(tuple(row_params))
+            for f in expr_fields:
+                if not isinstance(getattr(obj, f), SQLExpr):
+                    raise ValueError(f"Field {f} must be SQLExpr in all rows when using save_all.")
+
+        if len(param_fields) > 1:
+            get_params = attrgetter(*param_fields)
+        else:
+            get_params = lambda obj: tuple(getattr(obj, f) for f in param_fields)
+
+        values = [get_params(obj) for obj in objects]
 
         db.executemany(sql, values)
 
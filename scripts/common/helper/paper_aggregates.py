@@ -0,0 +1,185 @@
+from scripts.common.helper.entities import IntrinsicsExperiment, RangeImageExperiment, CompressionExperiment
+from scripts.common.helper.frame_robustness import ensure_frame_robustness, ROBUST_POINT_COUNT_THRESHOLD
+from scripts.common.helper.orm import Database, OrmEntity
+
+
+class PaperAggregate:
+    # summary of one experiment's results at the grain of a paper table, so generating the table only reads a few rows.
+    # Computed columns are CAST so the table created from the query declares their types for other engines
+    def __init__(self, table_name: str, experiment_type: type[OrmEntity], query: str, by_threshold: bool = False):
+        self.table_name = table_name
+        self.experiment_type = experiment_type
+        self.query = query
+        self.by_threshold = by_threshold
+
+    def create_table(self, db: Database):
+        params = {"experiment_id": None, "threshold": None}
+        db.execute(f"CREATE TABLE IF NOT EXISTS {self.table_name} AS SELECT * FROM ({self.query}) LIMIT 0", params)
+        db.execute(f"CREATE INDEX IF NOT EXISTS {self.table_name}_experiment_id_idx ON {self.table_name} (experiment_id)")
+
+    def update(self, db: Database, experiment_id: int, threshold: int | None = None):
+        condition, params = "experiment_id = :experiment_id", {"experiment_id": experiment_id, "threshold": threshold}
+        if self.by_threshold:
+            condition += " AND threshold = :threshold"
+
+        with db.transaction():
+            db.execute(f"DELETE FROM {self.table_name} WHERE {condition}", params)
+            db.execute(f"INSERT INTO {self.table_name} {self.query}", params)
+
+    def missing_experiment_ids(self, db: Database, threshold: int | None = None) -> list[int]:
+        condition, params = "1", ()
+        if self.by_threshold:
+            condition, params = "threshold = ?", (threshold,)
+
+        query = f"""
+            SELECT id FROM {self.experiment_type.__table__}
+            WHERE id NOT IN (SELECT experiment_id FROM {self.table_name} WHERE {condition})
+        """
+        return [row[0] for row in db.execute(query, params)]
+
+
+AGGREGATES = [
+    PaperAggregate("paper_agg_scanline_count", IntrinsicsExperiment, """
+        SELECT ifr.experiment_id,
+               d.name AS dataset,
+               fr.threshold,
+               CAST(fr.robust AS INTEGER) AS robust,
+               dfgt.scanlines_count AS true_count,
+               ifr.scanlines_count AS pred_count,
+               CAST(COUNT(*) AS INTEGER) AS count
+        FROM dataset d
+                 INNER JOIN dataset_frame df ON d.id = df.dataset_id
+                 INNER JOIN intrinsics_frame_result ifr ON df.id = ifr.dataset_frame_id
+                 INNER JOIN dataset_frame_gt dfgt ON df.id = dfgt.dataset_frame_id
+                 INNER JOIN frame_robustness fr ON fr.dataset_frame_id = df.id AND fr.threshold = :threshold
+        WHERE ifr.experiment_id = :experiment_id
+        GROUP BY d.name, fr.robust, dfgt.scanlines_count, ifr.scanlines_count
+    """, by_threshold=True),
+
+    PaperAggregate("paper_agg_resolution", IntrinsicsExperiment, """
+        SELECT ifr.experiment_id,
+               d.name AS dataset,
+               fr.threshold,
+               CAST(fr.robust AS INTEGER) AS robust,
+               laser_gt.horizontal_resolution AS true_resolution,
+               scanline.horizontal_resolution AS pred_resolution,
+               CAST(COUNT(*) AS INTEGER) AS count
+        FROM dataset d
+                 INNER JOIN dataset_frame df ON df.dataset_id = d.id
+                 INNER JOIN intrinsics_frame_result ifr ON ifr.dataset_frame_id = df.id
+                 INNER JOIN frame_robustness fr ON fr.dataset_frame_id = df.id AND fr.threshold = :threshold
+                 INNER JOIN dataset_frame_scanline_gt scanline_gt ON scanline_gt.dataset_frame_id = df.id
+                 INNER JOIN dataset_laser_gt laser_gt ON laser_gt.id = scanline_gt.laser_id
+                 LEFT JOIN intrinsics_scanline_result scanline ON scanline.intrinsics_result_id = ifr.id
+                    AND scanline.scanline_idx = scanline_gt.scanline_idx
+        WHERE ifr.experiment_id = :experiment_id
+        GROUP BY d.name, fr.robust, laser_gt.horizontal_resolution, scanline.horizontal_resolution
+    """, by_threshold=True),
+
+    # sums instead of averages, so the robust and non-robust groups can be combined into the "all" subset
+    PaperAggregate("paper_agg_per_beam", IntrinsicsExperiment, """
+        SELECT ifr.experiment_id,
+               d.name AS dataset,
+               fr.threshold,
+               CAST(fr.robust AS INTEGER) AS robust,
+               CAST(COUNT(*) AS INTEGER) AS count,
+               CAST(MAX(ABS((scanline.vertical_angle - laser_gt.vertical_angle) * 180 / PI())) AS REAL) AS v_angle_max,
+               CAST(SUM(ABS((scanline.vertical_angle - laser_gt.vertical_angle) * 180 / PI())) AS REAL) AS v_angle_sum,
+               CAST(MAX(ABS((scanline.vertical_offset - laser_gt.vertical_offset) * 1000)) AS REAL) AS v_offset_max,
+               CAST(SUM(ABS((scanline.vertical_offset - laser_gt.vertical_offset) * 1000)) AS REAL) AS v_offset_sum,
+               CAST(MAX(ABS((scanline.horizontal_offset - laser_gt.horizontal_offset) * 1000)) AS REAL) AS h_offset_max,
+               CAST(SUM(ABS((scanline.horizontal_offset - laser_gt.horizontal_offset) * 1000)) AS REAL) AS h_offset_sum,
+               CAST(MAX(ABS((scanline.horizontal_angle_offset - laser_gt.horizontal_angle_offset) * 180 / PI())) AS REAL) AS h_angle_offset_max,
+               CAST(SUM(ABS((scanline.horizontal_angle_offset - laser_gt.horizontal_angle_offset) * 180 / PI())) AS REAL) AS h_angle_offset_sum
+        FROM dataset d
+                 JOIN dataset_frame frame ON d.id = frame.dataset_id
+                 JOIN frame_robustness fr ON fr.dataset_frame_id = frame.id AND fr.threshold = :threshold
+                 JOIN dataset_frame_scanline_gt scanline_gt ON frame.id = scanline_gt.dataset_frame_id
+                 JOIN dataset_laser_gt laser_gt ON scanline_gt.laser_id = laser_gt.id
+                 JOIN intrinsics_frame_result ifr ON ifr.dataset_frame_id = frame.id
+                 JOIN intrinsics_scanline_result scanline ON scanline_gt.scanline_idx = scanline.scanline_idx
+                      AND scanline.intrinsics_result_id = ifr.id
+        WHERE ifr.experiment_id = :experiment_id
+        GROUP BY d.name, fr.robust
+    """, by_threshold=True),
+
+    PaperAggregate("paper_agg_ri", RangeImageExperiment, """
+        SELECT experiment_id, dataset, method, ri_width, ri_height,
+               CAST(AVG(chamfer) AS REAL) AS avg_cd, CAST(MAX(chamfer) AS REAL) AS max_cd,
+               CAST(AVG(psnr) AS REAL) AS avg_psnr, CAST(MIN(psnr) AS REAL) AS min_psnr,
+               CAST(AVG(sampling_error) AS REAL) AS avg_se, CAST(MAX(sampling_error) AS REAL) AS max_se
+        FROM (
+            SELECT rfs.experiment_id, d.name AS dataset, rfs.method, ri_width, ri_height,
+                   (original_to_reconstructed_rmse + reconstructed_to_original_rmse) / 2 AS chamfer,
+                   10 * log(max_range * max_range / original_to_reconstructed_mse) / log(10) AS psnr,
+                   (original_points_count - reconstructed_points_count) * 1.0 / original_points_count * 100 AS sampling_error
+            FROM ri_frame_result AS rfs
+                JOIN dataset_frame df ON rfs.dataset_frame_id = df.id
+                JOIN dataset d ON df.dataset_id = d.id
+            WHERE rfs.experiment_id = :experiment_id
+        )
+        GROUP BY dataset, method, ri_width, ri_height
+    """),
+
+    PaperAggregate("paper_agg_compression", CompressionExperiment, """
+        SELECT experiment_id,
+               error_threshold,
+               CAST(AVG(original_size_bytes * 1.0 / naive_size_bytes) AS REAL) AS cr_base,
+               CAST(AVG(original_size_bytes * 1.0 / accurate_size_bytes) AS REAL) AS cr_alice,
+               CAST(AVG((original_to_naive_rmse + naive_to_original_rmse) / 2) AS REAL) AS chamfer_base,
+               CAST(AVG((original_to_accurate_rmse + accurate_to_original_rmse) / 2) AS REAL) AS chamfer_alice,
+               CAST(AVG(10 * LOG(max_range * max_range / original_to_naive_mse) / LOG(10)) AS REAL) AS psnr_base,
+               CAST(AVG(10 * LOG(max_range * max_range / original_to_accurate_mse) / LOG(10)) AS REAL) AS psnr_alice,
+               CAST(AVG((original_points_count - naive_points_count) * 1.0 / original_points_count * 100) AS REAL) AS sampling_error_base,
+               CAST(AVG((original_points_count - accurate_points_count) * 1.0 / original_points_count * 100) AS REAL) AS sampling_error_alice
+        FROM compression_frame_result AS cfs
+                 JOIN dataset_frame df ON cfs.dataset_frame_id = df.id
+                 JOIN dataset d ON df.dataset_id = d.id
+        WHERE experiment_id = :experiment_id
+        GROUP BY error_threshold
+    """),
+]
+
+
+def update_paper_aggregates(db: Database, experiment_type: type[OrmEntity], experiment_ids: list[int] | None = None):
+    # recomputes the given experiments (by default all of them) for every robustness threshold already built
+    if experiment_ids is None:
+        experiment_ids = [row[0] for row in db.execute(f"SELECT id FROM {experiment_type.__table__}")]
+
+    for aggregate in aggregates_of(experiment_type):
+        aggregate.create_table(db)
+        for threshold in thresholds_of(db, aggregate):
+            for experiment_id in experiment_ids:
+                aggregate.update(db, experiment_id, threshold)
+
+
+def ensure_paper_aggregates(db: Database, experiment_type: type[OrmEntity],
+                            threshold: int = ROBUST_POINT_COUNT_THRESHOLD):
+    for aggregate in aggregates_of(experiment_type):
+        if aggregate.by_threshold:
+            ensure_frame_robustness(db, threshold)
+
+        aggregate.create_table(db)
+        for experiment_id in aggregate.missing_experiment_ids(db, threshold):
+            aggregate.update(db, experiment_id, threshold)
+
+
+def missing_paper_aggregates(db: Database, experiment_type: type[OrmEntity],
+                             threshold: int = ROBUST_POINT_COUNT_THRESHOLD) -> list[str]:
+    # read-only counterpart of ensure_paper_aggregates, the tables it would have to create or fill in
+    return [
+        aggregate.table_name for aggregate in aggregates_of(experiment_type)
+        if not db.table_exists(aggregate.table_name) or aggregate.missing_experiment_ids(db, threshold)
+    ]
+
+
+def aggregates_of(experiment_type: type[OrmEntity]) -> list[PaperAggregate]:
+    return [aggregate for aggregate in AGGREGATES if aggregate.experiment_type is experiment_type]
+
+
+def thresholds_of(db: Database, aggregate: PaperAggregate) -> list[int | None]:
+    if not aggregate.by_threshold:
+        return [None]
+
+    ensure_frame_robustness(db)
+    return [row[0] for row in db.execute("SELECT DISTINCT threshold FROM frame_robustness ORDER BY threshold")]
@@ -1,7 +1,51 @@
 import numpy as np
 
 
-def load_binary(file_path):
+class MappedFrame:
+    # a frame read through a read-only memory map. The zero-range returns are only looked for when points or intensity
+    # are first read, and each of them is only copied if there are some to drop
+    def __init__(self, data):
+        self.data = data
+        self._mask = None
+        self._all_valid = None
+
+    @classmethod
+    def from_file(cls, file_path):
+        return cls(np.memmap(file_path, dtype=np.float32, mode="r").reshape((-1, 4)))
+
+    @property
+    def mask(self):
+        if self._mask is None:
+            self._mask = calculate_range(self.data[:, :3]) > 0
+            self._all_valid = bool(np.all(self._mask))
+
+        return self._mask
+
+    @property
+    def points(self):
+        return self.__masked(self.data[:, :3])
+
+    @property
+    def intensity(self):
+        return self.__masked(self.data[:, 3])
+
+    def __masked(self, view):
+        mask = self.mask
+        if self._all_valid:
+            return view
+
+        return view[mask]
+
+
+def map_binary(file_path) -> MappedFrame:
+    return MappedFrame.from_file(file_path)
+
+
+def load_binary(file_path, mmap=False):
+    if mmap:
+        frame = map_binary(file_path)
+        return frame.points, frame.intensity
+
     data = np.fromfile(file_path, dtype=np.float32)
     data = data.reshape((-1, 4))
     points = data[:, :3]
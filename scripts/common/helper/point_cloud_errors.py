@@ -0,0 +1,50 @@
+import numpy as np
+import open3d as o3d
+
+# float64 like the Open3D point clouds the distances were computed with before, so the stored errors do not change
+DTYPE = np.float64
+
+
+class DistanceStats:
+    def __init__(self, squared_distances: np.ndarray, percentiles: tuple[float, ...] = ()):
+        # the index already returns squared distances, so the MSE and the max are taken before the in-place square
+        # root. Percentiles need a partial sort and are opt-in
+        self.count = squared_distances.shape[0]
+        self.mse = float(np.mean(squared_distances, dtype=np.float64))
+        self.rmse = float(np.sqrt(self.mse))
+        self.max = float(np.sqrt(np.max(squared_distances))) if self.count else 0.0
+
+        distances = np.sqrt(squared_distances, out=squared_distances)
+        self.mean = float(np.mean(distances, dtype=np.float64))
+        self.percentiles = dict(zip(percentiles, np.percentile(distances, percentiles).tolist())) if percentiles else {}
+
+
+class PointCloudErrors:
+    def __init__(self, reference_points):
+        self.reference = to_tensor(reference_points)
+        self.reference_index = build_index(self.reference)
+
+    def compute(self, points, percentiles: tuple[float, ...] = ()) -> tuple[DistanceStats, DistanceStats]:
+        points = to_tensor(points)
+
+        # only the reverse direction needs a new index, the reference one is shared by every reconstruction
+        to_reference = DistanceStats(nearest_squared_distances(self.reference_index, points), percentiles)
+        from_reference = DistanceStats(nearest_squared_distances(build_index(points), self.reference), percentiles)
+
+        return to_reference, from_reference
+
+
+def to_tensor(points) -> o3d.core.Tensor:
+    return o3d.core.Tensor.from_numpy(np.ascontiguousarray(points, dtype=DTYPE))
+
+
+def build_index(points: o3d.core.Tensor) -> o3d.core.nns.NearestNeighborSearch:
+    index = o3d.core.nns.NearestNeighborSearch(points)
+    index.knn_index()
+
+    return index
+
+
+def nearest_squared_distances(index: o3d.core.nns.NearestNeighborSearch, queries: o3d.core.Tensor) -> np.ndarray:
+    _, squared_distances = index.knn_search(queries, 1)
+    return squared_distances.numpy()[:, 0]
@@ -0,0 +1,39 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+ItemType = TypeVar("ItemType")
+LoadedType = TypeVar("LoadedType")
+
+_END = object()
+
+
+def prefetch(
+        items: Iterable[ItemType], load: Callable[[ItemType], LoadedType], depth: int = 4, workers: int = 2
+) -> Iterator[tuple[ItemType, LoadedType]]:
+    if depth <= 0:
+        for item in items:
+            yield item, load(item)
+        return
+
+    items = iter(items)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+    pending = deque()
+
+    try:
+        # keep at most `depth` frames loaded or in flight ahead of the consumer
+        for item in items:
+            pending.append((item, executor.submit(load, item)))
+            if len(pending) >= depth:
+                break
+
+        while pending:
+            item, future = pending.popleft()
+
+            next_item = next(items, _END)
+            if next_item is not _END:
+                pending.append((next_item, executor.submit(load, next_item)))
+
+            yield item, future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
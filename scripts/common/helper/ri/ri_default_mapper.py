@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from scripts.common.helper.point_cloud import *
 from scripts.common.helper.ri.ri_mapper import *
 
@@ -9,9 +11,9 @@ class RangeImageDefaultMapper(RangeImageMapper):
         self.max_phi = 0
 
     def map(self, points):
-        theta = calculate_theta(points)
-        phi = calculate_phi(points)
+        return self.map_spherical(calculate_theta(points), calculate_phi(points))
 
+    def map_spherical(self, theta, phi):
         theta = (theta + np.pi) / (2 * np.pi) * (self.w - 1)
 
         self.min_phi, self.max_phi = np.min(phi), np.max(phi)
@@ -23,9 +25,43 @@ class RangeImageDefaultMapper(RangeImageMapper):
         return theta, phi
 
     def unmap(self):
-        theta_indices = np.linspace(-np.pi, np.pi, self.w, endpoint=True)
-        phi_indices = np.linspace(self.min_phi, self.max_phi, self.h, endpoint=True)
-
-        theta, phi = np.meshgrid(theta_indices, phi_indices)
+        theta, phi = np.meshgrid(theta_values(self.w), phi_values(self.h, self.min_phi, self.max_phi))
 
         return theta.flatten(), phi.flatten()
+
+    def unmap_points(self, pixels, r):
+        cos_theta, sin_theta = theta_trig_tables(self.w)
+
+        # the phi bounds come from each frame, so only the h values of its rows are computed here. They keep the dtype
+        # of min_phi and max_phi (float32 for float32 clouds), as unmap() does
+        phi = phi_values(self.h, self.min_phi, self.max_phi)
+        cos_phi, sin_phi = np.cos(phi), np.sin(phi)
+        phi_indices, theta_indices = np.divmod(pixels, self.w)
+
+        # same products as calculate_xyz, but gathered from per-row/per-column tables instead of a full grid
+        r_cos_phi = r * cos_phi[phi_indices]
+        x = r_cos_phi * cos_theta[theta_indices]
+        y = r_cos_phi * sin_theta[theta_indices]
+        z = r * sin_phi[phi_indices]
+
+        return np.stack((x, y, z), axis=-1, dtype=np.float64)
+
+
+def theta_values(w):
+    return np.linspace(-np.pi, np.pi, w, endpoint=True)
+
+
+def phi_values(h, min_phi, max_phi):
+    return np.linspace(min_phi, max_phi, h, endpoint=True)
+
+
+@lru_cache(maxsize=32)
+def theta_trig_tables(w):
+    theta = theta_values(w)
+    tables = np.cos(theta), np.sin(theta)
+
+    # cached arrays are shared between callers
+    for table in tables:
+        table.flags.writeable = False
+
+    return tables
@@ -1,10 +1,13 @@
 from abc import ABC, abstractmethod
 
+from scripts.common.helper.point_cloud import calculate_xyz
+
 
 class RangeImageMapper(ABC):
     def __init__(self, w, h):
         self.w = w
         self.h = h
+        self.collisions = 0
 
     @abstractmethod
     def map(self, points):
@@ -13,3 +16,7 @@ class RangeImageMapper(ABC):
     @abstractmethod
     def unmap(self):
         pass
+
+    def unmap_points(self, pixels, r):
+        theta, phi = self.unmap()
+        return calculate_xyz(phi[pixels], theta[pixels], r)
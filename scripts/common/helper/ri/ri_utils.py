@@ -1,32 +1,119 @@
 from scripts.common.helper.ri.ri_mapper import *
+from scripts.common.helper.ri.ri_default_mapper import RangeImageDefaultMapper
 from scripts.common.helper.point_cloud import *
 
+# fraction of occupied pixels below which a range image is kept as its occupied pixels only
+SPARSE_OCCUPANCY_THRESHOLD = 0.1
 
-def point_cloud_to_range_image(ri_mapper: RangeImageMapper, points, intensities=None):
+
+class SparseRangeImage:
+    def __init__(self, h, w, pixels, values):
+        self.shape = (h, w)
+        self.pixels = pixels
+        self.values = values
+
+    @property
+    def occupancy(self):
+        return self.pixels.shape[0] / (self.shape[0] * self.shape[1])
+
+    def to_dense(self):
+        image = np.full(self.shape, -1.0, dtype=np.float32)
+        image.ravel()[self.pixels] = self.values
+
+        return image
+
+
+def point_cloud_to_range_image(ri_mapper: RangeImageMapper, points, intensities=None, sparse=None, collision_mode="last"):
+    # sparse when the points cannot fill more than SPARSE_OCCUPANCY_THRESHOLD of the pixels, callers that need one
+    # representation (e.g. to save the image) override it with sparse=True/False
     r = calculate_range(points)
     theta, phi = ri_mapper.map(points)
 
-    range_image = np.full((ri_mapper.h, ri_mapper.w), -1.0, dtype=np.float32)
-    range_image[phi, theta] = r
+    if sparse is None:
+        sparse = points.shape[0] / (ri_mapper.w * ri_mapper.h) < SPARSE_OCCUPANCY_THRESHOLD
+
+    pixels, winners = scatter(phi.astype(np.int64) * ri_mapper.w + theta, r, collision_mode)
+    ri_mapper.collisions = points.shape[0] - pixels.shape[0]
+
+    range_image = SparseRangeImage(ri_mapper.h, ri_mapper.w, pixels, r[winners].astype(np.float32))
+    intensity_image = None
 
     if intensities is not None:
-        intensity_image = np.full((ri_mapper.h, ri_mapper.w), -1.0, dtype=np.float32)
-        intensity_image[phi, theta] = intensities * 255
+        intensity_values = (intensities[winners] * 255).astype(np.float32)
+        intensity_image = SparseRangeImage(ri_mapper.h, ri_mapper.w, pixels, intensity_values)
+
+    if not sparse:
+        range_image = range_image.to_dense()
+        intensity_image = intensity_image.to_dense() if intensity_image is not None else None
 
+    if intensity_image is not None:
         return range_image, intensity_image
 
     return range_image
 
 
 def range_image_to_point_cloud(ri_mapper: RangeImageMapper, range_image):
-    theta, phi = ri_mapper.unmap()
-    r = range_image.flatten()
+    if isinstance(range_image, SparseRangeImage):
+        valid = range_image.values > 0
+        return ri_mapper.unmap_points(range_image.pixels[valid], range_image.values[valid])
+
+    r = range_image.ravel()
+    pixels = np.flatnonzero(r > 0)
+
+    return ri_mapper.unmap_points(pixels, r[pixels])
+
+
+def range_image_round_trips(ri_mappers: list[RangeImageDefaultMapper], points, collision_mode="last"):
+    theta, phi = calculate_theta(points), calculate_phi(points)
+    r = calculate_range(points).astype(np.float32)
+    points_count = r.shape[0]
+
+    offsets = np.cumsum([0] + [ri_mapper.w * ri_mapper.h for ri_mapper in ri_mappers])
+    pixels = np.empty(len(ri_mappers) * points_count, dtype=np.int64)
+
+    for i, ri_mapper in enumerate(ri_mappers):
+        theta_indices, phi_indices = ri_mapper.map_spherical(theta, phi)
+        pixels[i * points_count:(i + 1) * points_count] = offsets[i] + phi_indices.astype(np.int64) * ri_mapper.w + theta_indices
+
+    pixels, winners = scatter(pixels, np.tile(r, len(ri_mappers)), collision_mode)
+    pixel_r = r[winners % points_count]
+
+    occupied_counts = np.diff(np.searchsorted(pixels, offsets))
+    for ri_mapper, occupied_count in zip(ri_mappers, occupied_counts):
+        ri_mapper.collisions = points_count - occupied_count
+
+    valid = pixel_r > 0
+    pixels, pixel_r = pixels[valid], pixel_r[valid]
+    bounds = np.searchsorted(pixels, offsets)
+
+    reconstructed = []
+    for i, ri_mapper in enumerate(ri_mappers):
+        start, end = bounds[i], bounds[i + 1]
+        reconstructed.append(ri_mapper.unmap_points(pixels[start:end] - offsets[i], pixel_r[start:end]))
+
+    return reconstructed
+
+
+def scatter(pixels, r, collision_mode="last"):
+    """Returns the occupied pixels in ascending order and, for each one, the index of the point that wins it.
+
+    Collisions are resolved by keeping the last or first point scattered into the pixel, or the nearest or farthest one
+    by range (ties keep the first point). "last" reproduces the plain range_image[phi, theta] = r assignment.
+    """
+    indices = np.arange(pixels.shape[0])
+    keys = {
+        "last": lambda: -indices,
+        "first": lambda: indices,
+        "nearest": lambda: r,
+        "farthest": lambda: -r,
+    }
 
-    valid = r > 0
-    phi = phi[valid]
-    theta = theta[valid]
-    r = r[valid]
+    if collision_mode not in keys:
+        raise ValueError(f"Unknown collision mode: {collision_mode}")
 
-    points = calculate_xyz(phi, theta, r)
+    # lexsort is stable, so equal keys within a pixel stay in scatter order
+    order = np.lexsort((keys[collision_mode](), pixels))
+    sorted_pixels = pixels[order]
 
-    return points
\ No newline at end of file
+    group_starts = np.flatnonzero(np.diff(sorted_pixels, prepend=-1))
+    return sorted_pixels[group_starts], order[group_starts]
@@ -0,0 +1,217 @@
+import json
+import os
+import random
+import time
+from typing import Iterator
+
+DEFAULT_CHUNK_FRAMES = 16
+DEFAULT_LEASE_SECONDS = 30 * 60
+POLL_SECONDS = 60
+MAX_ATTEMPTS = 3
+
+PLAN_FILE = "plan.json"
+
+
+class LeaseLostError(Exception):
+    pass
+
+
+class FailedChunksError(Exception):
+    pass
+
+
+class FrameChunk:
+    def __init__(self, index: int, frame_ids: list[int], lease_path: str | None = None, done_path: str | None = None,
+                 token: str | None = None):
+        self.index = index
+        self.frame_ids = frame_ids
+        self.lease_path = lease_path
+        self.done_path = done_path
+        self.token = token
+
+    def renew(self):
+        # called after every frame and right before the results are committed, so the lease cannot expire in between.
+        # Raises if the lease expired and another task took the chunk over
+        if self.lease_path is None:
+            return
+
+        self.__check_lease()
+        os.utime(self.lease_path)
+
+    def complete(self):
+        # only once the results of the chunk are committed, a task that dies before that leaves the chunk leased
+        if self.lease_path is None:
+            return
+
+        self.__check_lease()
+        open(self.done_path, "w").close()
+        os.remove(self.lease_path)
+
+    def __check_lease(self):
+        if read_lease(self.lease_path)[0] != self.token:
+            raise LeaseLostError(f"Lease of chunk {self.index} was taken over by another task")
+
+
+class FrameQueue:
+    # frames split in chunks that the tasks of an array claim from a directory on the shared file system, so faster
+    # tasks take more chunks. A claim is a lease file created atomically and renewed by its task after every frame. The
+    # lease of a dead task expires and another task takes the chunk over, at most MAX_ATTEMPTS times so a frame that
+    # crashes every task does not bring the whole array down, but every task that finishes afterwards fails. The first
+    # task writes the plan, the rest read it.
+    def __init__(self, queue_dir: str, task_id: int, frame_ids: list[int], chunk_size: int = DEFAULT_CHUNK_FRAMES,
+                 lease_seconds: int = DEFAULT_LEASE_SECONDS):
+        self.queue_dir = queue_dir
+        self.task_id = task_id
+        self.lease_seconds = lease_seconds
+        self.token = f"{task_id}:{os.uname().nodename}:{os.getpid()}"
+
+        os.makedirs(queue_dir, exist_ok=True)
+        self.chunks = self.__load_plan(frame_ids, chunk_size)
+        self.__forget_done_chunks()
+
+    def claim_chunks(self) -> Iterator[FrameChunk]:
+        while (chunk := self.__claim_next()) is not None:
+            yield chunk
+
+        failed = self.failed_chunks()
+        if failed:
+            frames_count = sum(len(self.chunks[index]) for index in failed)
+            raise FailedChunksError(f"Chunks {failed} ({frames_count} frames) failed {MAX_ATTEMPTS} times and were skipped")
+
+    def failed_chunks(self) -> list[int]:
+        return sorted(int(entry.split(".")[0]) for entry in os.listdir(self.queue_dir) if entry.endswith(".done.failed"))
+
+    def __claim_next(self) -> FrameChunk | None:
+        while True:
+            entries = os.listdir(self.queue_dir)
+            done = {int(entry.split(".")[0]) for entry in entries if ".done." in entry}
+            leased = {int(entry.split(".")[0]) for entry in entries if entry.endswith(".lease")}
+
+            # at random, so the tasks do not all race for the same chunks
+            free = [index for index in range(len(self.chunks)) if index not in done and index not in leased]
+            if free:
+                index = random.choice(free)
+                if self.__try_lease(index, attempt=1):
+                    return self.__chunk(index)
+                continue
+
+            # a lease left by a previous run of this same task is stale, there is no point in waiting for it
+            own = [index for index in leased - done if self.__leased_by_previous_run(index)]
+            expired = own or [index for index in leased - done if self.__lease_expired(index)]
+            if expired:
+                index = random.choice(expired)
+                if self.__try_take_over(index):
+                    return self.__chunk(index)
+                continue
+
+            if not leased - done:
+                return None
+
+            # the other chunks may belong to a dead task, so they are waited for until done or taken over
+            time.sleep(min(POLL_SECONDS, self.lease_seconds))
+
+    def __try_lease(self, index: int, attempt: int) -> bool:
+        try:
+            fd = os.open(self.__lease_path(index), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+
+        with os.fdopen(fd, "w") as f:
+            f.write(f"{self.token} {attempt}")
+        return True
+
+    def __try_take_over(self, index: int) -> bool:
+        lease_path = self.__lease_path(index)
+        stale_path = f"{lease_path}.stale.{self.token}"
+
+        # renaming is atomic, so only one of the tasks that found the lease expired takes it over
+        try:
+            os.rename(lease_path, stale_path)
+        except FileNotFoundError:
+            return False
+
+        owner, attempt = read_lease(stale_path)
+        owner_task_id = owner.split(":")[0] if owner else "unknown"
+        os.remove(stale_path)
+        if attempt >= MAX_ATTEMPTS:
+            print(f"Chunk {index} failed {attempt} times (last by task {owner_task_id}), skipping it")
+            open(self.__done_path(index, "failed"), "w").close()
+            return False
+
+        print(f"Taking over chunk {index} from task {owner_task_id} (attempt {attempt + 1})")
+        return self.__try_lease(index, attempt + 1)
+
+    def __leased_by_previous_run(self, index: int) -> bool:
+        token, _ = read_lease(self.__lease_path(index))
+        return token is not None and token != self.token and token.split(":")[0] == str(self.task_id)
+
+    def __lease_expired(self, index: int) -> bool:
+        try:
+            return time.time() - os.path.getmtime(self.__lease_path(index)) > self.lease_seconds
+        except FileNotFoundError:
+            return False
+
+    def __load_plan(self, frame_ids: list[int], chunk_size: int) -> list[list[int]]:
+        plan_path = os.path.join(self.queue_dir, PLAN_FILE)
+        temp_path = f"{plan_path}.{self.token}"
+
+        if not os.path.exists(plan_path):
+            chunks = [frame_ids[i:i + chunk_size] for i in range(0, len(frame_ids), chunk_size)]
+            with open(temp_path, "w") as f:
+                json.dump(chunks, f)
+
+            # linking fails if another task wrote its plan first, in which case that one is used
+            try:
+                os.link(temp_path, plan_path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(temp_path)
+
+        with open(plan_path) as f:
+            chunks = json.load(f)
+
+        unknown_frame_ids = {frame_id for chunk in chunks for frame_id in chunk} - set(frame_ids)
+        assert not unknown_frame_ids, f"Queue {self.queue_dir} has {len(unknown_frame_ids)} frames this task does not know"
+
+        return chunks
+
+    def __forget_done_chunks(self):
+        # the part database of the task is recreated on every run, so the chunks it completed before must be redone,
+        # and the failed chunks are retried
+        suffixes = (f".done.{self.task_id}", ".done.failed")
+        for entry in os.listdir(self.queue_dir):
+            if entry.endswith(suffixes):
+                os.remove(os.path.join(self.queue_dir, entry))
+
+    def __chunk(self, index: int) -> FrameChunk:
+        return FrameChunk(index, self.chunks[index], self.__lease_path(index), self.__done_path(index, self.task_id),
+                          self.token)
+
+    def __lease_path(self, index: int) -> str:
+        return os.path.join(self.queue_dir, f"{index}.lease")
+
+    def __done_path(self, index: int, owner: int | str) -> str:
+        return os.path.join(self.queue_dir, f"{index}.done.{owner}")
+
+
+def claim_frame_chunks(queue_dir: str | None, task_id: int, task_count: int, frame_ids: list[int],
+                       chunk_size: int = DEFAULT_CHUNK_FRAMES) -> Iterator[FrameChunk]:
+    # without a queue directory the frames are split statically by id, all in a single chunk
+    if queue_dir is None:
+        task_frame_ids = [frame_id for frame_id in frame_ids if frame_id % task_count == task_id]
+        if task_frame_ids:
+            yield FrameChunk(0, task_frame_ids)
+        return
+
+    yield from FrameQueue(queue_dir, task_id, frame_ids, chunk_size).claim_chunks()
+
+
+def read_lease(lease_path: str) -> tuple[str | None, int]:
+    try:
+        with open(lease_path) as f:
+            token, attempt = f.read().split()
+    except (FileNotFoundError, ValueError):
+        return None, 0
+
+    return token, int(attempt)
@@ -0,0 +1,68 @@
+import argparse
+
+from scripts.common.helper.entities import *
+from scripts.common.helper.orm import Database
+
+ENTITY_TYPES = [
+    DatasetEntity,
+    DatasetFrame,
+    DatasetLaserGt,
+    DatasetFrameGt,
+    DatasetFrameScanlineGt,
+    IntrinsicsExperiment,
+    IntrinsicsFrameResult,
+    IntrinsicsScanlineResult,
+    RangeImageExperiment,
+    RangeImageFrameResult,
+    CompressionExperiment,
+    CompressionFrameResult,
+    MergeManifestEntry,
+    FrameRobustness,
+]
+
+DEFAULT_PAGE_SIZE = 16384
+# WAL needs shared memory between the processes using the database, which the HPC shared file system does not
+# provide, so it is only meant for the local copy in results/db
+DEFAULT_JOURNAL_MODE = "DELETE"
+# rows sampled per index by ANALYZE, enough for the planner without reading the whole master database after each merge
+ANALYSIS_LIMIT = 1000
+
+
+def main():
+    args = parse_args()
+    optimize_db(args.db_path, args.journal_mode, args.page_size)
+
+
+def optimize_db(db_path: str, journal_mode: str = DEFAULT_JOURNAL_MODE, page_size: int = DEFAULT_PAGE_SIZE):
+    with Database(db_path) as db:
+        # the page size of an existing database only changes when it is rebuilt, which WAL mode does not allow
+        if db.execute("PRAGMA page_size").fetchone()[0] != page_size:
+            print(f"Rebuilding {db_path} with {page_size} bytes pages...")
+            db.apply_pragmas({"journal_mode": "DELETE", "page_size": page_size})
+            db.execute("VACUUM")
+
+        db.apply_pragmas({"journal_mode": journal_mode})
+
+        with db.transaction():
+            for entity_type in ENTITY_TYPES:
+                if db.table_exists(entity_type.__table__):
+                    entity_type.create_indexes(db)
+
+        db.apply_pragmas({"analysis_limit": ANALYSIS_LIMIT})
+        db.execute("ANALYZE")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Create the declared indexes, apply the storage PRAGMAs and refresh the planner statistics."
+    )
+    parser.add_argument("db_path", help="Part or master database to optimize")
+    parser.add_argument("--journal_mode", default=DEFAULT_JOURNAL_MODE, choices=["WAL", "DELETE"],
+                        help="Journal mode stored in the database, WAL only for databases on a local disk")
+    parser.add_argument("--page_size", type=int, default=DEFAULT_PAGE_SIZE, help="Page size in bytes")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import os
+from collections import defaultdict
+
+from scripts.common.helper.entities import DatasetEntity, DatasetFrame
+from scripts.common.helper.frame_archive import FrameArchive
+from scripts.common.helper.orm import Database
+
+
+def main():
+    args = parse_args()
+    os.makedirs(args.archive_dir, exist_ok=True)
+
+    with Database(args.db_path) as db:
+        dataset = DatasetEntity.one(db, "name = ?", (args.dataset,))
+        assert dataset is not None, f"Dataset '{args.dataset}' not found in {args.db_path}"
+        frames = DatasetFrame.where(db, "dataset_id = ?", (dataset.id,))
+
+    frames_by_sequence = defaultdict(list)
+    for frame in frames:
+        frames_by_sequence[FrameArchive.sequence_name(frame.relative_path)].append(frame.relative_path)
+
+    sequences_count = len(frames_by_sequence)
+    for sequence_index, (sequence_name, relative_paths) in enumerate(sorted(frames_by_sequence.items())):
+        data_path = os.path.join(args.archive_dir, sequence_name + FrameArchive.DATA_SUFFIX)
+
+        if os.path.exists(data_path + FrameArchive.INDEX_SUFFIX) and not args.overwrite:
+            print(f"[{sequence_index + 1}/{sequences_count}] {sequence_name} already packed, skipping")
+            continue
+
+        points_count = FrameArchive.pack(data_path, args.dataset_root, relative_paths)
+        print(f"[{sequence_index + 1}/{sequences_count}] Packed {len(relative_paths)} frames "
+              f"({points_count} points) into {data_path}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pack every dataset sequence into a single contiguous frame archive.")
+    parser.add_argument("db_path", help="Database with the dataset_frame entries to pack")
+    parser.add_argument("dataset", choices=["kitti", "durlar"], help="Dataset to pack")
+    parser.add_argument("dataset_root", help="Root directory of the dataset frames")
+    parser.add_argument("archive_dir", help="Output directory for the frame archives")
+    parser.add_argument("--overwrite", action="store_true", help="Re-pack sequences that already have an archive")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
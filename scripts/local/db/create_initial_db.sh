@@ -16,6 +16,7 @@ else
     
     sqlite3 "$TEMP_DB" < scripts/local/db/helper/experiments_db.sql
     python -m scripts.local.db.helper.populate_db_base_entities
+    python -m scripts.common.optimize_db "$TEMP_DB" --journal_mode=DELETE
     mv "$TEMP_DB" "$LOCAL_SQLITE_INITIAL_DB"
     
     trap - EXIT
@@ -0,0 +1,14 @@
+#!/bin/bash
+set -eo pipefail
+pushd "$(dirname "${BASH_SOURCE[0]}")" > /dev/null
+
+source ../../common/load_env.sh
+
+pushd "$PROJECT_ROOT" > /dev/null
+
+echo "Exporting $LOCAL_SQLITE_MASTER_DB to Parquet at $LOCAL_PARQUET_DIR..."
+python -m scripts.local.db.helper.export_parquet "$@"
+echo "Parquet export finished successfully."
+
+popd > /dev/null
+popd > /dev/null
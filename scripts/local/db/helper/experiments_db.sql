@@ -52,6 +52,16 @@ CREATE TABLE dataset_frame_scanline_gt
 );
 CREATE INDEX dataset_frame_scanline_gt_dataset_frame_id_idx ON dataset_frame_scanline_gt (dataset_frame_id);
 CREATE INDEX dataset_frame_scanline_gt_dataset_frame_id_scanline_idx ON dataset_frame_scanline_gt (dataset_frame_id, laser_id);
+CREATE INDEX dataset_frame_scanline_gt_points_count_dataset_frame_id_idx ON dataset_frame_scanline_gt (points_count, dataset_frame_id);
+
+CREATE TABLE frame_robustness
+(
+    id integer PRIMARY KEY AUTOINCREMENT,
+    dataset_frame_id integer NOT NULL REFERENCES dataset_frame (id),
+    threshold integer NOT NULL,
+    robust boolean NOT NULL
+);
+CREATE INDEX frame_robustness_threshold_dataset_frame_id_robust_idx ON frame_robustness (threshold, dataset_frame_id, robust);
 
 CREATE TABLE intrinsics_experiment
 (
@@ -80,6 +90,7 @@ CREATE TABLE intrinsics_frame_result
     UNIQUE (experiment_id, dataset_frame_id)
 );
 CREATE INDEX intrinsics_frame_result_experiment_id_idx ON intrinsics_frame_result (experiment_id);
+CREATE INDEX intrinsics_frame_result_dataset_frame_id_idx ON intrinsics_frame_result (dataset_frame_id);
 CREATE INDEX intrinsics_frame_result_experiment_id_dataset_frame_id_idx ON intrinsics_frame_result (experiment_id, dataset_frame_id);
 
 CREATE TABLE intrinsics_scanline_result
@@ -146,6 +157,7 @@ CREATE TABLE compression_frame_result
     original_to_accurate_rmse real NOT NULL
 );
 CREATE INDEX compression_frame_result_experiment_id_idx ON compression_frame_result (experiment_id);
+CREATE INDEX compression_frame_result_dataset_frame_id_idx ON compression_frame_result (dataset_frame_id);
 CREATE INDEX compression_frame_result_experiment_id_dataset_frame_id_idx ON compression_frame_result (experiment_id, dataset_frame_id);
 
 CREATE TABLE ri_experiment
@@ -173,4 +185,5 @@ CREATE TABLE ri_frame_result
     original_to_reconstructed_rmse real NOT NULL
 );
 CREATE INDEX ri_frame_result_experiment_id_idx ON ri_frame_result (experiment_id);
+CREATE INDEX ri_frame_result_dataset_frame_id_idx ON ri_frame_result (dataset_frame_id);
 CREATE INDEX ri_frame_result_experiment_id_dataset_frame_id_idx ON ri_frame_result (experiment_id, dataset_frame_id);
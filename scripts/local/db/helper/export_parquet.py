@@ -0,0 +1,192 @@
+import argparse
+import os
+import shutil
+import sqlite3
+from contextlib import closing
+from typing import Iterator
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from scripts.common.helper.entities import *
+from scripts.common.helper.orm import DEFAULT_CHUNK_SIZE, OrmEntity, connect
+from scripts.common.helper.paper_aggregates import AGGREGATES
+from scripts.common.load_env import load_env
+
+load_env()
+
+
+class Config:
+    DB_PATH = os.getenv("LOCAL_SQLITE_MASTER_DB")
+    PARQUET_DIR = os.getenv("LOCAL_PARQUET_DIR")
+
+    MAX_ROWS_PER_GROUP = 1 << 20
+
+
+class ExportedTable:
+    # an entity table plus the columns it is partitioned by, joined in from the tables they live in when needed
+    def __init__(self, entity_type: type[OrmEntity], partition_columns: list[tuple[str, str, pa.DataType]] = (),
+                 joins: str = ""):
+        self.entity_type = entity_type
+        self.partition_columns = partition_columns
+        self.joins = joins
+
+    @property
+    def name(self) -> str:
+        return self.entity_type.__table__
+
+    def columns(self, conn: sqlite3.Connection) -> list[tuple[str, pa.DataType]]:
+        return [(field, arrow_type(field_type)) for field, field_type in self.entity_type.__annotations__.items()]
+
+    def query(self, conn: sqlite3.Connection) -> str:
+        table_columns = [column for column, _ in self.columns(conn)]
+        columns = [f"t.{column}" for column in table_columns]
+        columns += [f"{expression} AS {column}" for column, expression, _ in self.partition_columns
+                    if column not in table_columns]
+        return f"SELECT {', '.join(columns)} FROM {self.name} t {self.joins} ORDER BY t.rowid"
+
+    def schema(self, conn: sqlite3.Connection) -> pa.Schema:
+        table_columns = self.columns(conn)
+        fields = [pa.field(column, column_type) for column, column_type in table_columns]
+        fields += [pa.field(column, column_type) for column, _, column_type in self.partition_columns
+                   if column not in dict(table_columns)]
+        return pa.schema(fields)
+
+    def partitioning(self, schema: pa.Schema) -> ds.Partitioning | None:
+        if not self.partition_columns:
+            return None
+
+        return ds.partitioning(pa.schema([schema.field(column) for column, _, _ in self.partition_columns]), flavor="hive")
+
+
+class ExportedAggregate(ExportedTable):
+    # paper_agg_* tables have no entity, their columns come from the types the table was created with
+    def __init__(self, table_name: str, partition_columns: list[tuple[str, str, pa.DataType]] = ()):
+        super().__init__(None, partition_columns)
+        self.table_name = table_name
+
+    @property
+    def name(self) -> str:
+        return self.table_name
+
+    def columns(self, conn: sqlite3.Connection) -> list[tuple[str, pa.DataType]]:
+        sql_types = {"INT": pa.int64(), "INTEGER": pa.int64(), "REAL": pa.float64()}
+        return [
+            (column, sql_types.get(sql_type.upper(), pa.dictionary(pa.int32(), pa.string())))
+            for _, column, sql_type, *_ in conn.execute(f"PRAGMA table_info({self.table_name})")
+        ]
+
+
+EXPERIMENT_ID = ("experiment_id", "t.experiment_id", pa.int64())
+DATASET = ("dataset", "d.name", pa.string())
+FRAME_JOINS = "JOIN dataset_frame df ON df.id = t.dataset_frame_id JOIN dataset d ON d.id = df.dataset_id"
+
+TABLES = [
+    ExportedTable(DatasetEntity),
+    ExportedTable(DatasetFrame, [DATASET], "JOIN dataset d ON d.id = t.dataset_id"),
+    ExportedTable(DatasetLaserGt, [DATASET], "JOIN dataset d ON d.id = t.dataset_id"),
+    ExportedTable(DatasetFrameGt, [DATASET], FRAME_JOINS),
+    ExportedTable(DatasetFrameScanlineGt, [DATASET], FRAME_JOINS),
+    ExportedTable(FrameRobustness, [DATASET], FRAME_JOINS),
+    ExportedTable(IntrinsicsExperiment),
+    ExportedTable(IntrinsicsFrameResult, [EXPERIMENT_ID, DATASET], FRAME_JOINS),
+    ExportedTable(
+        IntrinsicsScanlineResult,
+        [("experiment_id", "ifr.experiment_id", pa.int64()), DATASET],
+        "JOIN intrinsics_frame_result ifr ON ifr.id = t.intrinsics_result_id "
+        "JOIN dataset_frame df ON df.id = ifr.dataset_frame_id JOIN dataset d ON d.id = df.dataset_id"
+    ),
+    ExportedTable(RangeImageExperiment),
+    ExportedTable(RangeImageFrameResult, [EXPERIMENT_ID, DATASET], FRAME_JOINS),
+    ExportedTable(CompressionExperiment),
+    ExportedTable(CompressionFrameResult, [EXPERIMENT_ID, DATASET], FRAME_JOINS),
+] + [ExportedAggregate(aggregate.table_name, [EXPERIMENT_ID]) for aggregate in AGGREGATES]
+
+
+def main():
+    args = parse_args()
+    tables = [table for table in TABLES if not args.tables or table.name in args.tables]
+
+    # the writer pulls the batches from its own thread, one at a time. A sqlite3 connection used as a context manager
+    # only ends the transaction, closing() is what closes it
+    with closing(connect(args.db_path, check_same_thread=False)) as conn:
+        for table in tables:
+            if not table_exists(conn, table.name):
+                print(f"Skipping {table.name}, not in the database")
+                continue
+
+            print(f"Exporting {table.name}...")
+            rows_count = export_table(conn, table, os.path.join(args.parquet_dir, table.name))
+            print(f" - {rows_count} rows")
+
+
+def export_table(conn: sqlite3.Connection, table: ExportedTable, table_dir: str) -> int:
+    schema = table.schema(conn)
+    rows_count = 0
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        nonlocal rows_count
+        cur = conn.cursor()
+        cur.execute(table.query(conn))
+        while rows := cur.fetchmany(DEFAULT_CHUNK_SIZE):
+            rows_count += len(rows)
+            yield record_batch(rows, schema)
+
+    if os.path.exists(table_dir):
+        shutil.rmtree(table_dir)
+
+    ds.write_dataset(
+        batches(), table_dir, schema=schema, format="parquet", partitioning=table.partitioning(schema),
+        max_rows_per_group=Config.MAX_ROWS_PER_GROUP, file_options=parquet_options()
+    )
+
+    return rows_count
+
+
+def table_exists(conn: sqlite3.Connection, table_name: str) -> bool:
+    query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+    return conn.execute(query, (table_name,)).fetchone() is not None
+
+
+def record_batch(rows: list[tuple], schema: pa.Schema) -> pa.RecordBatch:
+    columns = []
+    for field, values in zip(schema, zip(*rows)):
+        if pa.types.is_dictionary(field.type):
+            columns.append(pa.array(values, pa.string()).dictionary_encode())
+        elif pa.types.is_boolean(field.type):
+            columns.append(pa.array([None if value is None else bool(value) for value in values], field.type))
+        else:
+            columns.append(pa.array(values, field.type))
+
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def arrow_type(py_type: type) -> pa.DataType:
+    # strings are mostly repeated labels (methods, end reasons, hashes), so they are dictionary encoded
+    mapping = {
+        int: pa.int64(),
+        int | None: pa.int64(),
+        float: pa.float64(),
+        bool: pa.bool_(),
+    }
+    return mapping.get(py_type, pa.dictionary(pa.int32(), pa.string()))
+
+
+def parquet_options() -> ds.FileWriteOptions:
+    return ds.ParquetFileFormat().make_write_options(compression="zstd", use_dictionary=True)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Export the master database tables to Parquet, partitioned by experiment and dataset."
+    )
+    parser.add_argument("--db_path", default=Config.DB_PATH, help="Database to export")
+    parser.add_argument("--parquet_dir", default=Config.PARQUET_DIR, help="Output directory, one folder per table")
+    parser.add_argument("--tables", nargs="+", choices=[table.name for table in TABLES],
+                        help="Tables to export (defaults to all of them)")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
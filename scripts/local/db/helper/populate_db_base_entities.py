@@ -1,9 +1,9 @@
-import glob
 from scripts.common.helper.orm import *
 from scripts.common.helper.entities import *
 from scripts.common.helper.datasets.kitti import *
 from scripts.common.helper.datasets.durlar import *
 from scripts.common.helper.ground_truth import *
+from scripts.common.helper.frame_archive import FrameSource
 import os
 
 from scripts.common.load_env import load_env
@@ -11,13 +11,13 @@ load_env()
 
 class DatasetConfiguration:
     info: Dataset
-    base_path: str
+    source: FrameSource
     frames_glob: str
     first_frame_path: str
 
-    def __init__(self, info: Dataset, base_path: str, frames_glob: str, first_frame_path: str):
+    def __init__(self, info: Dataset, source: FrameSource, frames_glob: str, first_frame_path: str):
         self.info = info
-        self.base_path = base_path
+        self.source = source
         self.frames_glob = frames_glob
         self.first_frame_path = first_frame_path
 
@@ -25,13 +25,13 @@ class Config:
     datasets_frames: dict[str, tuple[Dataset, str]] = {
         "kitti": DatasetConfiguration(
             KITTI(),
-            os.getenv("LOCAL_KITTI_PATH"),
+            FrameSource(os.getenv("LOCAL_KITTI_PATH"), os.getenv("LOCAL_KITTI_ARCHIVE_PATH")),
             "*/*/velodyne_points/data/*.bin",
             "2011_09_26/2011_09_26_drive_0001_sync/velodyne_points/data/0000000000.bin",
         ),
         "durlar": DatasetConfiguration(
             DurLAR(),
-            os.getenv("LOCAL_DURLAR_PATH"),
+            FrameSource(os.getenv("LOCAL_DURLAR_PATH"), os.getenv("LOCAL_DURLAR_ARCHIVE_PATH")),
             "*/ouster_points/data/*.bin",
             "DurLAR_20210716/ouster_points/data/0000000000.bin",
         )
@@ -41,7 +41,7 @@ def main():
     db_path = os.getenv("LOCAL_SQLITE_INITIAL_DB")
     print(f"Will populate base entities in the database {db_path}")
 
-    with Database(db_path) as db:
+    with Database(db_path) as db, db.transaction():
         for d_name, d_configuration in Config.datasets_frames.items():
             print(f"Populating for dataset: {d_name}")
             dataset = DatasetEntity(
@@ -52,20 +52,16 @@ def main():
             dataset.save(db)
 
             print(" - Adding frames...")
-            frames_paths = glob.glob(os.path.join(d_configuration.base_path, d_configuration.frames_glob))
-            frames_rel_paths = [os.path.relpath(path, d_configuration.base_path) for path in frames_paths]
+            frames_rel_paths = d_configuration.source.relative_paths(d_configuration.frames_glob)
             frames = [DatasetFrame(dataset_id=dataset.id, relative_path=path) for path in frames_rel_paths]
 
             DatasetFrame.save_all(db, frames)
 
             print(" - Adding ground truth values...")
-            points, _ = load_binary(os.path.join(d_configuration.base_path, d_configuration.first_frame_path))
+            points = d_configuration.source.load_points(d_configuration.first_frame_path)
             points = points[calculate_range(points) > 0]
 
-            d_info = d_configuration.info
-            _, gt_result = compute_ground_truth(
-                points, d_info.v_angles, d_info.v_offsets, d_info.h_offsets, d_info.h_resolutions
-            )
+            _, gt_result = compute_ground_truth(points, d_configuration.info.intrinsics)
 
             for gt_scanline in gt_result["scanlines"]:
                 gt_entity = DatasetLaserGt(
@@ -7,6 +7,9 @@ source ../../common/load_env.sh
 
 pushd "$PROJECT_ROOT" > /dev/null
 
+# the only step that writes into master.sqlite, the table scripts just read the paper_agg_* tables
+python -m scripts.local.paper.helper.prepare_paper_aggregates
+
 python -m scripts.local.paper.helper.generate_vote_for_discontinuities_data
 python -m scripts.local.paper.helper.generate_scanline_counts_table
 python -m scripts.local.paper.helper.generate_resolutions_table
@@ -1,6 +1,8 @@
 from scripts.common.helper.entities import IntrinsicsExperiment, RangeImageExperiment, CompressionExperiment
+from scripts.common.helper.frame_robustness import ROBUST_POINT_COUNT_THRESHOLD
+from scripts.common.helper.orm import OrmEntity
+from scripts.common.helper.paper_aggregates import missing_paper_aggregates
 from scripts.common.helper.orm import Database
-from scripts.local.paper.helper.utils import pd_read_sqlite_query
 
 
 def fetch_main_experiment_id(db_path: str) -> int:
@@ -25,3 +27,16 @@ def fetch_compression_experiment_id(db_path: str) -> int:
         experiments = CompressionExperiment.all(db)
         assert len(experiments) == 1, f"Expected exactly one experiment, got {len(experiments)}"
         return experiments[0].id
+
+
+def check_paper_aggregates(db_path: str, experiment_type: type[OrmEntity],
+                           threshold: int = ROBUST_POINT_COUNT_THRESHOLD):
+    # the tables only read the paper_agg_* tables, filling them in is a separate step that writes into the master
+    with Database(db_path) as db:
+        missing_tables = missing_paper_aggregates(db, experiment_type, threshold)
+
+    if missing_tables:
+        raise RuntimeError(
+            f"{db_path} is missing paper aggregates in {', '.join(missing_tables)}, compute them first with "
+            f"python -m scripts.local.paper.helper.prepare_paper_aggregates"
+        )
@@ -4,12 +4,16 @@ import pandas as pd
 from typing import Callable
 
 from scripts.common.load_env import load_env
-from scripts.local.paper.helper.utils import pd_read_sqlite_query, df_to_latex, write_paper_data
+from scripts.common.helper.entities import IntrinsicsExperiment
+from scripts.common.helper.frame_robustness import ROBUST_POINT_COUNT_THRESHOLD
+from scripts.local.paper.helper.common import check_paper_aggregates
+from scripts.local.paper.helper.utils import QueryBackend, pd_read_query, df_to_latex, write_paper_data
 
 load_env()
 
 class Config:
     DB_PATH = os.getenv("LOCAL_SQLITE_MASTER_DB")
+    QUERY_BACKEND = os.getenv("PAPER_QUERY_BACKEND", QueryBackend.SQLITE)
 
     COLS_RENAME_LEVEL_0 = {
         "components": "\\textbf{Algorithm Components}",
@@ -30,11 +34,12 @@ class Config:
 
 def main():
     print(f"Using database at {Config.DB_PATH}")
+    check_paper_aggregates(Config.DB_PATH, IntrinsicsExperiment, ROBUST_POINT_COUNT_THRESHOLD)
 
-    print("Computing scanline ablation results from DB. This may take a while...")
+    print("Fetching scanline ablation results from DB...")
     scanline_ablation_df = generate_ablation_df(fetch_and_compute_scanline_ablation)
 
-    print("Computing resolution ablation results from DB. This will take a long while (go for a coffee)...")
+    print("Fetching resolution ablation results from DB...")
     resolution_ablation_df = generate_ablation_df(fetch_and_compute_resolution_ablation)
 
     full_ablation_df = generate_full_ablation_df(scanline_ablation_df, resolution_ablation_df)
@@ -67,59 +72,46 @@ def generate_ablation_df(fetch_func: Callable[[], pd.DataFrame]) -> pd.DataFrame
     return scanline_ablation_final_df
 
 
-def fetch_and_compute_scanline_ablation(robust_point_count_threshold=64) -> pd.DataFrame:
+def fetch_and_compute_scanline_ablation(robust_point_count_threshold=ROBUST_POINT_COUNT_THRESHOLD) -> pd.DataFrame:
     query = """
         SELECT e.id AS exp_id,
                e.use_hough_continuity,
                e.use_scanline_conflict_solver,
                e.use_vertical_heuristics,
                e.use_horizontal_heuristics,
-               d.name AS dataset,
-               dfgt.dataset_frame_id NOT IN (
-                    SELECT DISTINCT dataset_frame_id
-                    FROM dataset_frame_scanline_gt
-                    WHERE points_count < ?
-               ) AS robust,
-               COUNT(CASE WHEN dfgt.scanlines_count != ifr.scanlines_count THEN 1 END) AS incorrect_count
-        FROM dataset d
-             INNER JOIN dataset_frame df ON d.id = df.dataset_id
-             INNER JOIN intrinsics_frame_result ifr ON df.id = ifr.dataset_frame_id
-             INNER JOIN intrinsics_experiment e ON e.id = ifr.experiment_id
-             INNER JOIN dataset_frame_gt dfgt ON df.id = dfgt.dataset_frame_id
-        GROUP BY exp_id, dataset, robust;
+               agg.dataset,
+               agg.robust,
+               SUM(CASE WHEN agg.true_count != agg.pred_count THEN agg.count ELSE 0 END) AS incorrect_count
+        FROM paper_agg_scanline_count agg
+             INNER JOIN intrinsics_experiment e ON e.id = agg.experiment_id
+        WHERE agg.threshold = ?
+        GROUP BY exp_id, e.use_hough_continuity, e.use_scanline_conflict_solver, e.use_vertical_heuristics,
+                 e.use_horizontal_heuristics, dataset, robust;
     """
 
-    return pd_read_sqlite_query(Config.DB_PATH, query, params=(robust_point_count_threshold, ))
+    return pd_read_query(Config.DB_PATH, query, params=(robust_point_count_threshold, ), backend=Config.QUERY_BACKEND)
 
 
-def fetch_and_compute_resolution_ablation(robust_point_count_threshold=64) -> pd.DataFrame:
+def fetch_and_compute_resolution_ablation(robust_point_count_threshold=ROBUST_POINT_COUNT_THRESHOLD) -> pd.DataFrame:
     query = """
         SELECT e.id AS exp_id,
             e.use_hough_continuity,
             e.use_scanline_conflict_solver,
             e.use_vertical_heuristics,
             e.use_horizontal_heuristics,
-            d.name AS dataset,
-            scanline_gt.dataset_frame_id NOT IN (
-                SELECT DISTINCT dataset_frame_id
-                FROM dataset_frame_scanline_gt
-                WHERE points_count < ?
-            ) AS robust,
-            COUNT(CASE WHEN 
-                laser_gt.horizontal_resolution != COALESCE(scanline.horizontal_resolution, -1)
-            THEN 1 END) AS incorrect_count
-        FROM dataset d
-                 INNER JOIN dataset_frame df ON df.dataset_id = d.id
-                 INNER JOIN intrinsics_frame_result ifr ON ifr.dataset_frame_id = df.id
-                 INNER JOIN intrinsics_experiment e ON e.id = ifr.experiment_id
-                 INNER JOIN dataset_frame_scanline_gt scanline_gt ON scanline_gt.dataset_frame_id = df.id
-                 INNER JOIN dataset_laser_gt laser_gt ON laser_gt.id = scanline_gt.laser_id
-                 LEFT JOIN intrinsics_scanline_result scanline ON scanline.intrinsics_result_id = ifr.id
-                    AND scanline.scanline_idx = scanline_gt.scanline_idx
-        GROUP BY exp_id, dataset, robust
+            agg.dataset,
+            agg.robust,
+            SUM(CASE WHEN
+                agg.true_resolution != COALESCE(agg.pred_resolution, -1)
+            THEN agg.count ELSE 0 END) AS incorrect_count
+        FROM paper_agg_resolution agg
+                 INNER JOIN intrinsics_experiment e ON e.id = agg.experiment_id
+        WHERE agg.threshold = ?
+        GROUP BY exp_id, e.use_hough_continuity, e.use_scanline_conflict_solver, e.use_vertical_heuristics,
+                 e.use_horizontal_heuristics, dataset, robust
     """
 
-    return pd_read_sqlite_query(Config.DB_PATH, query, params=(robust_point_count_threshold, ))
+    return pd_read_query(Config.DB_PATH, query, params=(robust_point_count_threshold, ), backend=Config.QUERY_BACKEND)
 
 
 def format_to_experiment_configuration(df: pd.DataFrame, robust_only: bool) -> pd.DataFrame:
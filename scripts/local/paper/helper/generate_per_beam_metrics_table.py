@@ -3,13 +3,15 @@ import os
 import pandas as pd
 
 from scripts.common.load_env import load_env
-from scripts.local.paper.helper.common import fetch_main_experiment_id
-from scripts.local.paper.helper.utils import pd_read_sqlite_query, df_to_latex, write_paper_data
+from scripts.common.helper.entities import IntrinsicsExperiment
+from scripts.local.paper.helper.common import fetch_main_experiment_id, check_paper_aggregates
+from scripts.local.paper.helper.utils import QueryBackend, pd_read_query, df_to_latex, write_paper_data
 
 load_env()
 
 class Config:
     DB_PATH = os.getenv("LOCAL_SQLITE_MASTER_DB")
+    QUERY_BACKEND = os.getenv("PAPER_QUERY_BACKEND", QueryBackend.SQLITE)
     ROBUST_POINT_COUNT_THRESHOLD = 64
     OUTPUT_FILE = "per_beam_metrics.tex"
 
@@ -29,8 +31,9 @@ def main():
     print(f"Using database at {Config.DB_PATH}")
     experiment_id = fetch_main_experiment_id(Config.DB_PATH)
     print(f"Experiment ID: {experiment_id}")
+    check_paper_aggregates(Config.DB_PATH, IntrinsicsExperiment, Config.ROBUST_POINT_COUNT_THRESHOLD)
 
-    print("Computing MAX and MAE from DB. This may take a while...")
+    print("Fetching MAX and MAE from DB...")
     max_mae_all_df = fetch_and_compute_max_and_mae(experiment_id, robust_only=False).assign(subset="all")
     max_mae_robust_only = fetch_and_compute_max_and_mae(experiment_id, robust_only=True).assign(subset="robust_only")
 
@@ -46,48 +49,22 @@ def main():
 
 def fetch_and_compute_max_and_mae(experiment_id: int, robust_only: bool) -> pd.DataFrame:
     query = f"""
-        WITH scanline_diffs AS (
-            SELECT
-                d.name AS dataset,
-                exp.id AS experiment_id,
-                frame.id AS dataset_frame_id,
-                scanline_gt.points_count AS points_count,
-
-                scanline.vertical_angle - laser_gt.vertical_angle AS v_angle_diff,
-                scanline.vertical_offset - laser_gt.vertical_offset AS v_offset_diff,
-                scanline.horizontal_offset - laser_gt.horizontal_offset AS h_offset_diff,
-                scanline.horizontal_angle_offset - laser_gt.horizontal_angle_offset AS h_angle_offset_diff
-            FROM dataset d
-                     JOIN dataset_frame frame ON d.id = frame.dataset_id
-                     JOIN dataset_frame_scanline_gt scanline_gt ON frame.id = scanline_gt.dataset_frame_id
-                     JOIN dataset_laser_gt laser_gt ON scanline_gt.laser_id = laser_gt.id
-                     JOIN intrinsics_frame_result ifr ON ifr.dataset_frame_id = frame.id
-                     JOIN intrinsics_experiment exp ON ifr.experiment_id = exp.id
-                     JOIN intrinsics_scanline_result scanline ON scanline_gt.scanline_idx = scanline.scanline_idx
-                          AND scanline.intrinsics_result_id = ifr.id
-        )
         SELECT dataset,
-            MAX(ABS(v_angle_diff * 180 / PI())) AS v_angle_max,
-            AVG(ABS(v_angle_diff * 180 / PI())) AS v_angle_mae,
-            MAX(ABS(v_offset_diff * 1000)) AS v_offset_max,
-            AVG(ABS(v_offset_diff * 1000)) AS v_offset_mae,
-            MAX(ABS(h_offset_diff * 1000)) AS h_offset_max,
-            AVG(ABS(h_offset_diff * 1000)) AS h_offset_mae,
-            MAX(ABS(h_angle_offset_diff * 180 / PI())) AS h_angle_offset_max,
-            AVG(ABS(h_angle_offset_diff * 180 / PI())) AS h_angle_offset_mae,
-            { """ dataset_frame_id NOT IN ( 
-                    SELECT dataset_frame_id
-                    FROM dataset_frame_scanline_gt 
-                    WHERE points_count < ?
-                ) as robust_filter""" if robust_only else "1 as robust_filter"
-            }
-        FROM scanline_diffs
-        WHERE experiment_id = ? AND robust_filter
+            MAX(v_angle_max) AS v_angle_max,
+            SUM(v_angle_sum) / SUM(count) AS v_angle_mae,
+            MAX(v_offset_max) AS v_offset_max,
+            SUM(v_offset_sum) / SUM(count) AS v_offset_mae,
+            MAX(h_offset_max) AS h_offset_max,
+            SUM(h_offset_sum) / SUM(count) AS h_offset_mae,
+            MAX(h_angle_offset_max) AS h_angle_offset_max,
+            SUM(h_angle_offset_sum) / SUM(count) AS h_angle_offset_mae
+        FROM paper_agg_per_beam
+        WHERE experiment_id = ? AND threshold = ? {"AND robust = 1" if robust_only else ""}
         GROUP BY dataset
     """
 
-    params = (Config.ROBUST_POINT_COUNT_THRESHOLD, experiment_id) if robust_only else (experiment_id,)
-    return pd_read_sqlite_query(Config.DB_PATH, query, params=params).drop(columns=["robust_filter"])
+    params = (experiment_id, Config.ROBUST_POINT_COUNT_THRESHOLD)
+    return pd_read_query(Config.DB_PATH, query, params=params, backend=Config.QUERY_BACKEND)
 
 
 def format_final_table(df: pd.DataFrame) -> pd.DataFrame:
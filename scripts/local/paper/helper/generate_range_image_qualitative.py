@@ -12,6 +12,8 @@ from scripts.local.paper.helper.utils import save_point_cloud_visualization, sav
 load_env()
 
 class Config:
+    MMAP_FRAMES = True
+
     class Reconstruction:
         __ESTIMATION_CLOUD_PATH = "2011_09_26/2011_09_26_drive_0009_sync/velodyne_points/data/0000000000.bin"
         ESTIMATION_CLOUD_PATH = os.path.join(os.getenv("LOCAL_KITTI_PATH"), __ESTIMATION_CLOUD_PATH)
@@ -76,7 +78,7 @@ def generate_range_image_figures():
 
     print(" - Projecting/Unprojecting range images...")
     pbea_ri_mapper = RangeImageDefaultMapper(2048, 128)
-    pbea_ri = point_cloud_to_range_image(pbea_ri_mapper, points)
+    pbea_ri = point_cloud_to_range_image(pbea_ri_mapper, points, sparse=False)
 
     x, y, z = points[:, 0], points[:, 1], points[:, 2]
     alice_ri = alice_lri.project_to_range_image(intrinsics, x, y, z)
@@ -91,11 +93,11 @@ def generate_range_image_figures():
 def load_intrinsics_and_points(estimation_path: str, target_path:str) -> tuple[alice_lri.Intrinsics, np.ndarray]:
     print(" - Estimating ALICE-LRI intrinsics...")
 
-    points, _ = load_binary(estimation_path)
+    points, _ = load_binary(estimation_path, mmap=Config.MMAP_FRAMES)
     x, y, z = points[:, 0], points[:, 1], points[:, 2]
     intrinsics = alice_lri.estimate_intrinsics(x, y, z)
 
-    points, _ = load_binary(target_path)
+    points, _ = load_binary(target_path, mmap=Config.MMAP_FRAMES)
     return intrinsics, points
 
 
@@ -4,15 +4,17 @@ import numpy as np
 import pandas as pd
 
 from scripts.common.load_env import load_env
-from scripts.local.paper.helper.common import fetch_main_experiment_id
+from scripts.common.helper.entities import IntrinsicsExperiment
+from scripts.local.paper.helper.common import fetch_main_experiment_id, check_paper_aggregates
 from scripts.local.paper.helper.metrics import metrics_from_confusion_df
-from scripts.local.paper.helper.utils import pd_read_sqlite_query, df_format_dataset_names, df_to_latex, \
+from scripts.local.paper.helper.utils import QueryBackend, pd_read_query, df_format_dataset_names, df_to_latex, \
     write_paper_data
 
 load_env()
 
 class Config:
     DB_PATH = os.getenv("LOCAL_SQLITE_MASTER_DB")
+    QUERY_BACKEND = os.getenv("PAPER_QUERY_BACKEND", QueryBackend.SQLITE)
     ROBUST_POINT_COUNT_THRESHOLD = 64
 
     SUBSET_REPLACE = {
@@ -34,8 +36,9 @@ def main():
     print(f"Using database at {Config.DB_PATH}")
     experiment_id = fetch_main_experiment_id(Config.DB_PATH)
     print(f"Experiment ID: {experiment_id}")
+    check_paper_aggregates(Config.DB_PATH, IntrinsicsExperiment, Config.ROBUST_POINT_COUNT_THRESHOLD)
 
-    print("Computing confusion matrices from DB. This may take a while...")
+    print("Fetching confusion matrices from DB...")
     confusion_matrix_all_df = fetch_and_compute_confusion_matrix(experiment_id)
     confusion_matrix_robust_only = confusion_matrix_all_df[confusion_matrix_all_df["robust"] == True]
 
@@ -49,29 +52,19 @@ def main():
     write_paper_data(latex, Config.OUTPUT_FILE)
 
 
-def fetch_and_compute_confusion_matrix(experiment_id: int, robust_point_count_threshold=64) -> pd.DataFrame:
+def fetch_and_compute_confusion_matrix(experiment_id: int, robust_point_count_threshold=Config.ROBUST_POINT_COUNT_THRESHOLD) -> pd.DataFrame:
     query = """
-         SELECT name AS dataset,
-                scanline_gt.dataset_frame_id NOT IN (
-                    SELECT DISTINCT dataset_frame_id
-                    FROM dataset_frame_scanline_gt
-                    WHERE points_count < ?
-                ) AS robust,
-                laser_gt.horizontal_resolution AS true,
-                COALESCE(scanline.horizontal_resolution, -1) AS pred,
-                COUNT(*) AS count
-         FROM dataset d
-                  INNER JOIN dataset_frame df ON df.dataset_id = d.id
-                  INNER JOIN intrinsics_frame_result ifr ON ifr.dataset_frame_id = df.id
-                  INNER JOIN dataset_frame_scanline_gt scanline_gt ON scanline_gt.dataset_frame_id = df.id
-                  INNER JOIN dataset_laser_gt laser_gt ON laser_gt.id = scanline_gt.laser_id
-                  LEFT JOIN intrinsics_scanline_result scanline ON scanline.intrinsics_result_id = ifr.id
-                    AND scanline.scanline_idx = scanline_gt.scanline_idx
-         WHERE experiment_id = ?
-         GROUP BY name, robust, laser_gt.horizontal_resolution, scanline.horizontal_resolution
+         SELECT dataset,
+                robust,
+                true_resolution AS true,
+                COALESCE(pred_resolution, -1) AS pred,
+                count
+         FROM paper_agg_resolution
+         WHERE experiment_id = ? AND threshold = ?
+         ORDER BY dataset, robust, true_resolution, pred_resolution
     """
 
-    return pd_read_sqlite_query(Config.DB_PATH, query, params=(robust_point_count_threshold, experiment_id))
+    return pd_read_query(Config.DB_PATH, query, params=(experiment_id, robust_point_count_threshold), backend=Config.QUERY_BACKEND)
 
 
 def format_final_table(df: pd.DataFrame) -> pd.DataFrame:
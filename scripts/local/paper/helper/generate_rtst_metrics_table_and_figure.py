@@ -4,13 +4,15 @@ import numpy as np
 import pandas as pd
 
 from scripts.common.load_env import load_env
-from scripts.local.paper.helper.common import fetch_compression_experiment_id
-from scripts.local.paper.helper.utils import pd_read_sqlite_query, df_to_latex, write_paper_data
+from scripts.common.helper.entities import CompressionExperiment
+from scripts.local.paper.helper.common import fetch_compression_experiment_id, check_paper_aggregates
+from scripts.local.paper.helper.utils import QueryBackend, pd_read_query, df_to_latex, write_paper_data
 
 load_env()
 
 class Config:
     DB_PATH = os.getenv("LOCAL_SQLITE_MASTER_DB")
+    QUERY_BACKEND = os.getenv("PAPER_QUERY_BACKEND", QueryBackend.SQLITE)
 
     COLUMNS_RENAME_LEVEL_0 = {
         "cr": "\\textbf{Compression Ratio}",
@@ -32,8 +34,9 @@ def main():
     print(f"Using database at {Config.DB_PATH}")
     experiment_id = fetch_compression_experiment_id(Config.DB_PATH)
     print(f"Experiment ID: {experiment_id}")
+    check_paper_aggregates(Config.DB_PATH, CompressionExperiment)
 
-    print("Computing RTST metrics from DB...")
+    print("Fetching RTST metrics from DB...")
     rtst_metrics = fetch_and_compute_range_image_metrics_table(experiment_id)
 
     pd.set_option('display.max_columns', None)
@@ -53,23 +56,16 @@ def main():
 def fetch_and_compute_range_image_metrics_table(experiment_id: int) -> pd.DataFrame:
     query = """
         SELECT error_threshold,
-               AVG(original_size_bytes * 1.0 / naive_size_bytes) AS cr_base,
-               AVG(original_size_bytes * 1.0 / accurate_size_bytes) AS cr_alice,
-               AVG((original_to_naive_rmse + naive_to_original_rmse) / 2) AS chamfer_base,
-               AVG((original_to_accurate_rmse + accurate_to_original_rmse) / 2) AS chamfer_alice,
-               AVG(10 * LOG(max_range * max_range / original_to_naive_mse) / LOG(10)) AS psnr_base,
-               AVG(10 * LOG(max_range * max_range / original_to_accurate_mse) / LOG(10)) AS psnr_alice,
-               AVG((original_points_count - naive_points_count) * 1.0 / original_points_count * 100) AS sampling_error_base,
-               AVG((original_points_count - accurate_points_count) * 1.0 / original_points_count * 100) AS sampling_error_alice
-        FROM compression_frame_result AS cfs
-                 JOIN dataset_frame df ON cfs.dataset_frame_id = df.id
-                 JOIN dataset d ON df.dataset_id = d.id
+               cr_base, cr_alice,
+               chamfer_base, chamfer_alice,
+               psnr_base, psnr_alice,
+               sampling_error_base, sampling_error_alice
+        FROM paper_agg_compression
         WHERE experiment_id = ?
-        GROUP BY error_threshold
         ORDER BY error_threshold
     """
 
-    return pd_read_sqlite_query(Config.DB_PATH, query, params=(experiment_id, ))
+    return pd_read_query(Config.DB_PATH, query, params=(experiment_id, ), backend=Config.QUERY_BACKEND)
 
 
 def fetch_cr_vs_cd_sample(experiment_id: int, sample_size:int=1000) -> pd.DataFrame:
@@ -84,7 +80,7 @@ def fetch_cr_vs_cd_sample(experiment_id: int, sample_size:int=1000) -> pd.DataFr
         ORDER BY relative_path
     """
 
-    result_df = pd_read_sqlite_query(Config.DB_PATH, query, params=(experiment_id, ))
+    result_df = pd_read_query(Config.DB_PATH, query, params=(experiment_id, ), backend=Config.QUERY_BACKEND)
     result_df = result_df.sample(sample_size, replace=False, random_state=0)
 
     return result_df
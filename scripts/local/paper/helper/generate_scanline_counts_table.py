@@ -3,15 +3,17 @@ import os
 import pandas as pd
 
 from scripts.common.load_env import load_env
-from scripts.local.paper.helper.common import fetch_main_experiment_id
+from scripts.common.helper.entities import IntrinsicsExperiment
+from scripts.local.paper.helper.common import fetch_main_experiment_id, check_paper_aggregates
 from scripts.local.paper.helper.metrics import metrics_from_confusion_df
-from scripts.local.paper.helper.utils import pd_read_sqlite_query, df_to_latex, write_paper_data, \
+from scripts.local.paper.helper.utils import QueryBackend, pd_read_query, df_to_latex, write_paper_data, \
     df_format_dataset_names
 
 load_env()
 
 class Config:
     DB_PATH = os.getenv("LOCAL_SQLITE_MASTER_DB")
+    QUERY_BACKEND = os.getenv("PAPER_QUERY_BACKEND", QueryBackend.SQLITE)
     ROBUST_POINT_COUNT_THRESHOLD = 64
 
     SUBSET_REPLACE = {
@@ -39,8 +41,9 @@ def main():
     print(f"Using database at {Config.DB_PATH}")
     experiment_id = fetch_main_experiment_id(Config.DB_PATH)
     print(f"Experiment ID: {experiment_id}")
+    check_paper_aggregates(Config.DB_PATH, IntrinsicsExperiment, Config.ROBUST_POINT_COUNT_THRESHOLD)
 
-    print("Computing confusion matrices from DB. This may take a while...")
+    print("Fetching confusion matrices from DB...")
     confusion_matrix_all_df = fetch_and_compute_confusion_matrix(experiment_id)
     confusion_matrix_robust_only = confusion_matrix_all_df[confusion_matrix_all_df["robust"] == True]
 
@@ -54,24 +57,15 @@ def main():
     write_paper_data(latex, Config.OUTPUT_FILE)
 
 
-def fetch_and_compute_confusion_matrix(experiment_id: int, robust_point_count_threshold=64) -> pd.DataFrame:
+def fetch_and_compute_confusion_matrix(experiment_id: int, robust_point_count_threshold=Config.ROBUST_POINT_COUNT_THRESHOLD) -> pd.DataFrame:
     query = """
-            SELECT name AS dataset,
-                   dfgt.dataset_frame_id NOT IN (
-                       SELECT DISTINCT dataset_frame_id
-                       FROM dataset_frame_scanline_gt
-                       WHERE points_count < ?
-                   ) AS robust,
-                   dfgt.scanlines_count AS true, ifr.scanlines_count AS pred, COUNT(*) AS count
-            FROM dataset d
-                     INNER JOIN dataset_frame df ON d.id = df.dataset_id
-                     INNER JOIN intrinsics_frame_result ifr ON df.id = ifr.dataset_frame_id
-                     INNER JOIN dataset_frame_gt dfgt ON df.id = dfgt.dataset_frame_id
-            WHERE experiment_id == ?
-            GROUP BY name, robust, dfgt.scanlines_count, ifr.scanlines_count;
+            SELECT dataset, robust, true_count AS true, pred_count AS pred, count
+            FROM paper_agg_scanline_count
+            WHERE experiment_id = ? AND threshold = ?
+            ORDER BY dataset, robust, true_count, pred_count
             """
 
-    return pd_read_sqlite_query(Config.DB_PATH, query, params=(robust_point_count_threshold, experiment_id))
+    return pd_read_query(Config.DB_PATH, query, params=(experiment_id, robust_point_count_threshold), backend=Config.QUERY_BACKEND)
 
 
 def format_final_table(df: pd.DataFrame) -> pd.DataFrame:
@@ -1,6 +1,5 @@
 import numpy as np
 import pandas as pd
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 
 
 def metrics_from_confusion_df(
@@ -18,24 +17,44 @@ def metrics_from_confusion_df(
 
 
 def __metrics_single_group(df: pd.DataFrame, true_col: str, pred_col: str, count_col: str) -> pd.Series:
-    y_true = np.repeat(df[true_col].to_numpy(), df[count_col].to_numpy())
-    y_pred = np.repeat(df[pred_col].to_numpy(), df[count_col].to_numpy())
+    # same results as the sklearn scores (zero_division=0) on the samples the counts stand for, computed from the
+    # per-class true positives and true / predicted totals instead of expanding the counts into samples
+    df = df[df[count_col] > 0]
+    counts = df[count_col].to_numpy(dtype=np.int64)
+    samples = counts.sum()
 
-    if len(y_true) == 0:
+    if samples == 0:
         return pd.Series({
             "samples": 0, "incorrect": 0,
             "oa": 0.0, "mp": 0.0, "mr": 0.0, "mf1": 0.0,
             "wp": 0.0, "wr": 0.0, "wf1": 0.0
         })
 
+    labels, codes = np.unique(np.concatenate([df[true_col].to_numpy(), df[pred_col].to_numpy()]), return_inverse=True)
+    true_codes, pred_codes = np.split(codes, 2)
+    correct = true_codes == pred_codes
+
+    tp = np.bincount(true_codes[correct], weights=counts[correct], minlength=len(labels))
+    true_sum = np.bincount(true_codes, weights=counts, minlength=len(labels))
+    pred_sum = np.bincount(pred_codes, weights=counts, minlength=len(labels))
+
+    precision = __safe_divide(tp, pred_sum)
+    recall = __safe_divide(tp, true_sum)
+    f1 = __safe_divide(2 * tp, true_sum + pred_sum)
+    support = true_sum / samples
+
     return pd.Series({
-        "samples": len(y_true),
-        "incorrect": (y_true != y_pred).sum(),
-        "oa": accuracy_score(y_true, y_pred) * 100,
-        "mp": precision_score(y_true, y_pred, average="macro", zero_division=0) * 100,
-        "mr": recall_score(y_true, y_pred, average="macro", zero_division=0) * 100,
-        "mf1": f1_score(y_true, y_pred, average="macro", zero_division=0) * 100,
-        "wp": precision_score(y_true, y_pred, average="weighted", zero_division=0) * 100,
-        "wr": recall_score(y_true, y_pred, average="weighted", zero_division=0) * 100,
-        "wf1": f1_score(y_true, y_pred, average="weighted", zero_division=0) * 100,
+        "samples": samples,
+        "incorrect": int(samples - tp.sum()),
+        "oa": tp.sum() / samples * 100,
+        "mp": precision.mean() * 100,
+        "mr": recall.mean() * 100,
+        "mf1": f1.mean() * 100,
+        "wp": (precision * support).sum() * 100,
+        "wr": (recall * support).sum() * 100,
+        "wf1": (f1 * support).sum() * 100,
     })
+
+
+def __safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    return np.divide(numerator, denominator, out=np.zeros(len(numerator)), where=denominator > 0)
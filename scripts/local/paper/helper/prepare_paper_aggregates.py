@@ -0,0 +1,38 @@
+import argparse
+import os
+
+from scripts.common.load_env import load_env
+from scripts.common.helper.entities import IntrinsicsExperiment, RangeImageExperiment, CompressionExperiment
+from scripts.common.helper.frame_robustness import ROBUST_POINT_COUNT_THRESHOLD
+from scripts.common.helper.orm import Database
+from scripts.common.helper.paper_aggregates import ensure_paper_aggregates
+
+load_env()
+
+class Config:
+    DB_PATH = os.getenv("LOCAL_SQLITE_MASTER_DB")
+    EXPERIMENT_TYPES = [IntrinsicsExperiment, RangeImageExperiment, CompressionExperiment]
+
+
+def main():
+    args = parse_args()
+    print(f"Using database at {args.db_path}")
+
+    # the merge keeps the paper_agg_* tables up to date, this only fills in what older masters are missing
+    with Database(args.db_path) as db:
+        for experiment_type in Config.EXPERIMENT_TYPES:
+            print(f"Preparing paper aggregates of {experiment_type.__table__}...")
+            ensure_paper_aggregates(db, experiment_type, args.threshold)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compute the paper_agg_* tables missing from the master database.")
+    parser.add_argument("--db_path", default=Config.DB_PATH, help="Master database (defaults to LOCAL_SQLITE_MASTER_DB)")
+    parser.add_argument("--threshold", type=int, default=ROBUST_POINT_COUNT_THRESHOLD,
+                        help="Point count threshold of the robust frames")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,14 @@
 import os
 import re
-import sqlite3
+import time
 
 import pandas as pd
 import numpy as np
 from matplotlib import pyplot as plt
 from sklearn.metrics import accuracy_score, precision_recall_fscore_support
 
+from scripts.common.helper.orm import connect
+
 def df_to_latex(df: pd.DataFrame, index=True, multirow=True, multicolumn=True, bold_rows=True, multicolumn_format="c", **kwargs) -> str:
     latex = df.to_latex(index=index, multirow=multirow, multicolumn=multicolumn, bold_rows=bold_rows, multicolumn_format=multicolumn_format, **kwargs)
     if multicolumn:
@@ -111,13 +113,107 @@ def df_format_dataset_names(df: pd.DataFrame, bold=False) -> pd.DataFrame:
 
 
 def pd_read_sqlite_query(path: str, query: str, **kwargs) -> pd.DataFrame:
-    conn = sqlite3.connect(path)
+    conn = connect(path)
     df = pd.read_sql_query(query, conn, **kwargs)
     conn.close()
 
     return df
 
 
+class QueryBackend:
+    # engines that can run the paper queries, selected per script with PAPER_QUERY_BACKEND
+    SQLITE = "sqlite"
+    DUCKDB = "duckdb"  # DuckDB attached read-only to the SQLite file
+    DUCKDB_PARQUET = "duckdb_parquet"  # DuckDB over the Parquet export in LOCAL_PARQUET_DIR
+    COMPARE = "compare"  # runs every backend, prints their times and checks they return the same rows
+
+    ALL = [SQLITE, DUCKDB, DUCKDB_PARQUET]
+
+
+def pd_read_query(path: str, query: str, params: tuple = (), backend: str = QueryBackend.SQLITE) -> pd.DataFrame:
+    # queries must only use SQL both engines read the same way, e.g. "* 1.0 /" for every division that is not
+    # meant to be an integer one, since DuckDB divides integers as floats
+    if backend == QueryBackend.SQLITE:
+        return pd_read_sqlite_query(path, query, params=params)
+    elif backend == QueryBackend.DUCKDB:
+        return pd_read_duckdb_sqlite_query(path, query, params)
+    elif backend == QueryBackend.DUCKDB_PARQUET:
+        return pd_read_duckdb_parquet_query(os.getenv("LOCAL_PARQUET_DIR"), query, params)
+    elif backend == QueryBackend.COMPARE:
+        return pd_compare_query_backends(path, query, params)
+
+    raise ValueError(f"Unknown query backend {backend}, expected one of {QueryBackend.ALL + [QueryBackend.COMPARE]}")
+
+
+def pd_read_duckdb_sqlite_query(path: str, query: str, params: tuple = ()) -> pd.DataFrame:
+    import duckdb  # only needed by the DuckDB backends, which the container does not ship
+
+    with duckdb.connect() as conn:
+        load_duckdb_sqlite_extension(conn)
+        conn.execute(f"ATTACH '{path.replace("'", "''")}' AS master (TYPE sqlite, READ_ONLY)")
+        conn.execute("USE master")
+        return conn.execute(query, params).df()
+
+
+def load_duckdb_sqlite_extension(conn):
+    import duckdb
+
+    # the extension is downloaded only the first time, a machine without network needs it installed beforehand
+    try:
+        conn.execute("LOAD sqlite")
+    except duckdb.IOException:
+        try:
+            conn.execute("INSTALL sqlite; LOAD sqlite")
+        except duckdb.IOException as e:
+            raise RuntimeError(
+                f"The {QueryBackend.DUCKDB} backend needs the DuckDB sqlite extension, which could not be downloaded. "
+                f"Install it once with network access (INSTALL sqlite), or use the {QueryBackend.DUCKDB_PARQUET} "
+                f"backend instead"
+            ) from e
+
+
+def pd_read_duckdb_parquet_query(parquet_dir: str, query: str, params: tuple = ()) -> pd.DataFrame:
+    import duckdb
+
+    # every exported table is a view over its folder, so the queries reference the same table names as in SQLite
+    with duckdb.connect() as conn:
+        for table in sorted(os.listdir(parquet_dir)):
+            table_glob = os.path.join(parquet_dir, table, "**", "*.parquet").replace("'", "''")
+            conn.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{table_glob}', hive_partitioning = true)")
+
+        return conn.execute(query, params).df()
+
+
+def pd_compare_query_backends(path: str, query: str, params: tuple = ()) -> pd.DataFrame:
+    results = {}
+    for backend in QueryBackend.ALL:
+        start = time.perf_counter()
+        results[backend] = pd_read_query(path, query, params, backend)
+        print(f" - {backend}: {(time.perf_counter() - start) * 1000:.1f} ms, {len(results[backend])} rows")
+
+    expected = sorted_rows(results[QueryBackend.SQLITE])
+    for backend, df in results.items():
+        # the engines differ in dtypes (e.g. booleans, dictionary strings) and in the order of tied rows
+        pd.testing.assert_frame_equal(expected, sorted_rows(df), check_dtype=False, check_exact=False, rtol=1e-9)
+
+    return results[QueryBackend.SQLITE]
+
+
+def sorted_rows(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.apply(lambda column: column.astype(int) if column.dtype == bool else column)
+    df = df.apply(lambda column: column.astype(str) if isinstance(column.dtype, pd.CategoricalDtype) else column)
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+def pd_read_parquet_table(parquet_dir: str, table: str, columns: list[str] | None = None, filters=None) -> pd.DataFrame:
+    # only the requested columns are read, and only from the partitions and row groups that can match the filters
+    # (a pyarrow expression or a list of (column, op, value) tuples, e.g. [("experiment_id", "=", 1)])
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(os.path.join(parquet_dir, table), columns=columns, filters=filters, partitioning="hive")
+    return table.to_pandas()
+
+
 def df_from_sql_table(connection, table: str, where: str|None=None, params: tuple|None=None) -> pd.DataFrame:
     clause = f"WHERE {where}" if where else ""
     query = f"SELECT * FROM {table} {clause}"
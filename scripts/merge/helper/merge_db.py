@@ -1,11 +1,19 @@
 import argparse
+import hashlib
+import multiprocessing
 import os
 import re
 import shutil
 import subprocess
+import tempfile
+import time
+from functools import partial
 
 from scripts.common.helper.orm import *
 from scripts.common.helper.entities import *
+from scripts.common.helper.frame_robustness import build_frame_robustness
+from scripts.common.helper.paper_aggregates import update_paper_aggregates
+from scripts.common.optimize_db import optimize_db
 
 class Constant:
     ARG_EXPERIMENTS = "experiments"
@@ -14,23 +22,137 @@ class Constant:
     ARG_GROUND_TRUTH = "ground_truth"
 
     MERGE_TYPES = [ARG_EXPERIMENTS, ARG_RI_EXPERIMENTS, ARG_COMPRESSION_EXPERIMENTS, ARG_GROUND_TRUTH]
+    EXPERIMENT_TYPES = {
+        ARG_EXPERIMENTS: IntrinsicsExperiment,
+        ARG_RI_EXPERIMENTS: RangeImageExperiment,
+        ARG_COMPRESSION_EXPERIMENTS: CompressionExperiment,
+    }
+
+    PART_SCHEMA = "part"
+    TIMESTAMP_EXPR = "DATETIME('now', 'localtime', 'subsec')"
+
+
+class MergeManifest:
+    def __init__(self, master_db_path: str, merge_type: str, db_files: list[str]):
+        self.merge_type = merge_type
+        self.__part_infos = {db_file: part_stat(db_file) for db_file in db_files}
+        self.__part_hashes = {}
+
+        with Database(master_db_path) as master_db:
+            MergeManifestEntry.create_table(master_db)
+            MergeManifestEntry.add_missing_columns(master_db)
+            entries = MergeManifestEntry.where(master_db, "merge_type = ?", (merge_type,))
+
+        # a part still at the path, size and mtime it was recorded with is not read again. Only parts with the size
+        # of a recorded one (e.g. moved or copied since) are hashed, the new ones are hashed when they are recorded
+        merged_by_stat = {(entry.part_path, entry.part_size, entry.part_mtime): entry for entry in entries}
+        merged_by_hash = {entry.part_hash: entry for entry in entries}
+        merged_sizes = {entry.part_size for entry in entries}
+
+        merged_entries = {}
+        for db_file, (part_size, part_mtime) in self.__part_infos.items():
+            entry = merged_by_stat.get((os.path.abspath(db_file), part_size, part_mtime))
+            if entry is None and part_size in merged_sizes:
+                entry = merged_by_hash.get(self.__hash(db_file))
+            if entry is not None:
+                merged_entries[db_file] = entry
+
+        self.pending_db_files = [db_file for db_file in db_files if db_file not in merged_entries]
+
+        experiment_ids = {entry.experiment_id for entry in merged_entries.values()}
+        if len(experiment_ids) > 1:
+            raise ValueError(f"Part databases were already merged under different experiments: {sorted(experiment_ids)}")
+
+        # parts left over from an interrupted merge go into the experiment the other parts already went to
+        self.experiment_id = next(iter(experiment_ids), None)
+        self.__parts_by_db_file = {db_file: [db_file] for db_file in self.pending_db_files}
+
+    def combine(self, merged_db_file: str, db_files: list[str]):
+        self.__parts_by_db_file[merged_db_file] = [
+            part for db_file in db_files for part in self.__parts_by_db_file.pop(db_file)
+        ]
+
+    def record(self, db: Database, db_file: str, experiment_id: int | None):
+        entries = []
+        for part in self.__parts_by_db_file[db_file]:
+            part_size, part_mtime = self.__part_infos[part]
+            entries.append(MergeManifestEntry(
+                timestamp=SQLExpr(Constant.TIMESTAMP_EXPR),
+                merge_type=self.merge_type,
+                experiment_id=experiment_id,
+                part_path=os.path.abspath(part),
+                part_size=part_size,
+                part_mtime=part_mtime,
+                part_hash=self.__hash(part)
+            ))
+
+        MergeManifestEntry.save_all(db, entries)
+
+    def __hash(self, db_file: str) -> str:
+        if db_file not in self.__part_hashes:
+            self.__part_hashes[db_file] = hash_file(db_file)
+
+        return self.__part_hashes[db_file]
 
 
 def main():
     args = parse_args()
 
-    print("Backing up database...")
-    backup_db(args.master_db_path)
+    print("Reading merge manifest...")
     db_files = get_db_files(args.part_dbs_folder_path)
+    manifest = MergeManifest(args.master_db_path, args.type, db_files)
+    db_files = manifest.pending_db_files
 
+    # without new parts only the derived tables are rebuilt, which a later run can always redo, so no backup is needed
+    if db_files and not args.skip_backup:
+        print("Backing up database...")
+        backup_db(args.master_db_path)
+
+    if db_files and manifest.experiment_id is not None:
+        print(f"Resuming merge into experiment {manifest.experiment_id}: {len(db_files)} part databases left")
+
+    if not db_files:
+        # a merge interrupted after its last part still has to refresh what is derived from the merged rows
+        print("All part databases were already merged.")
+        experiment_id = manifest.experiment_id
+    elif args.workers > 1 and len(db_files) > 2:
+        with tempfile.TemporaryDirectory(prefix="merge_", dir=args.work_dir or args.part_dbs_folder_path) as work_dir:
+            reduced_db_files = reduce_part_databases(db_files, args.type, work_dir, args.workers)
+            manifest.combine(reduced_db_files[0], db_files)
+            experiment_id = merge_databases(args, reduced_db_files, manifest)
+    else:
+        experiment_id = merge_databases(args, db_files, manifest)
+
+    update_derived_tables(args.master_db_path, args.type, experiment_id)
+
+    print("Optimizing master database...")
+    optimize_db(args.master_db_path, journal_mode="DELETE")
+
+
+def merge_databases(args: argparse.Namespace, db_files: list[str], manifest: MergeManifest) -> int | None:
+    # returns the experiment the parts were merged into, None for ground truth
     if args.type == Constant.ARG_EXPERIMENTS:
-        merge_experiment_databases(db_files, args.master_db_path, args.label, args.description)
+        return merge_experiment_databases(db_files, args.master_db_path, args.label, args.description, manifest)
     elif args.type == Constant.ARG_COMPRESSION_EXPERIMENTS:
-        merge_compression_experiment_databases(db_files, args.master_db_path, args.label, args.description)
+        return merge_compression_experiment_databases(db_files, args.master_db_path, args.label, args.description, manifest)
     elif args.type == Constant.ARG_RI_EXPERIMENTS:
-        merge_ri_experiment_databases(db_files, args.master_db_path, args.label, args.description)
+        return merge_ri_experiment_databases(db_files, args.master_db_path, args.label, args.description, manifest)
     elif args.type == Constant.ARG_GROUND_TRUTH:
-        merge_ground_truth_databases(db_files, args.master_db_path)
+        return merge_ground_truth_databases(db_files, args.master_db_path, manifest)
+
+
+def update_derived_tables(master_db_path: str, merge_type: str, experiment_id: int | None):
+    with Database(master_db_path) as master_db:
+        if merge_type == Constant.ARG_GROUND_TRUTH:
+            print("Building frame robustness table...")
+            build_frame_robustness(master_db)
+
+            # every intrinsics experiment is evaluated against the ground truth that just changed
+            print("Updating paper aggregates...")
+            update_paper_aggregates(master_db, IntrinsicsExperiment)
+        elif experiment_id is not None:
+            print("Updating paper aggregates...")
+            update_paper_aggregates(master_db, Constant.EXPERIMENT_TYPES[merge_type], [experiment_id])
 
 
 def parse_args() -> argparse.Namespace:
@@ -41,6 +163,12 @@ def parse_args() -> argparse.Namespace:
                         help=f"Type of databases to merge: {Constant.MERGE_TYPES}")
     parser.add_argument("--label")
     parser.add_argument("--description")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes merging part databases pairwise before the final merge into the master")
+    parser.add_argument("--work_dir", default=None,
+                        help="Directory for intermediate databases of the pairwise merge (defaults to the parts folder)")
+    parser.add_argument("--skip_backup", action="store_true",
+                        help="Do not back up the master first, an interrupted merge can be resumed by running it again")
     args = parser.parse_args()
 
     if args.type != Constant.ARG_GROUND_TRUTH:
@@ -60,102 +188,204 @@ def backup_db(merged_db_path):
         backup_db_path = f'{base_backup_db_path}.{index}'
 
     if os.path.exists(merged_db_path):
-        shutil.copy(merged_db_path, backup_db_path)
+        # the online backup API copies a consistent snapshot page by page instead of the raw file
+        with Database(merged_db_path) as source_db, Database(backup_db_path) as backup_db:
+            source_db.conn.backup(backup_db.conn)
 
 
-def merge_experiment_databases(db_files, master_db_path, label, description):
+def merge_experiment_databases(db_files, master_db_path, label, description, manifest: MergeManifest):
     with Database(master_db_path) as master_db:
         with Database(db_files[0]) as first_db:
             first_db_experiments = IntrinsicsExperiment.all(first_db)
             assert len(first_db_experiments) == 1, "Only one experiment per database is supported."
             experiment = first_db_experiments[0]
 
-            experiment.id = None
-            experiment.label = label
-            experiment.description = description
-            experiment.commit_hash = get_commit_hash()
-            experiment.timestamp = SQLExpr("DATETIME('now', 'localtime', 'subsec')")
-
-            merged_experiment_id = experiment.save(master_db)
+        experiment.id = None
+        experiment.label = label
+        experiment.description = description
+        experiment.commit_hash = get_commit_hash()
+        experiment.timestamp = SQLExpr(Constant.TIMESTAMP_EXPR)
 
+        merged_experiment_id = manifest.experiment_id
         files_count = len(db_files)
         for file_index, db_file in enumerate(db_files):
             print(f"Merging experiments database {file_index + 1}/{files_count}")
 
-            with Database(db_file) as db:
-                frame_results = IntrinsicsFrameResult.all(db)
-                for frame_result in frame_results:
-                    original_result_id = frame_result.id
-                    frame_result.experiment_id = merged_experiment_id
-
-                    frame_result.id = None
-                    new_result_id = frame_result.save(master_db)
+            with master_db.attached(db_file, Constant.PART_SCHEMA), master_db.transaction():
+                # the experiment is created with the first part so an interrupted merge never leaves it empty
+                if merged_experiment_id is None:
+                    merged_experiment_id = experiment.save(master_db)
 
-                    scanlines = IntrinsicsScanlineResult.where(db, "intrinsics_result_id = ?", (original_result_id,))
+                copy_intrinsics_part(master_db, merged_experiment_id)
+                manifest.record(master_db, db_file, merged_experiment_id)
 
-                    for scanline in scanlines:
-                        scanline.id = None
-                        scanline.intrinsics_result_id = new_result_id
+    return merged_experiment_id
 
-                    IntrinsicsScanlineResult.save_all(master_db, scanlines)
 
-
-def merge_compression_experiment_databases(db_files, master_db_path, label, description):
-    merge_generic_experiment_databases(
-        db_files, master_db_path, label, description, CompressionExperiment, CompressionFrameResult
+def merge_compression_experiment_databases(db_files, master_db_path, label, description, manifest: MergeManifest):
+    return merge_generic_experiment_databases(
+        db_files, master_db_path, label, description, manifest, CompressionExperiment, CompressionFrameResult
     )
 
 
-def merge_ri_experiment_databases(db_files, master_db_path, label, description):
-    merge_generic_experiment_databases(
-        db_files, master_db_path, label, description, RangeImageExperiment, RangeImageFrameResult
+def merge_ri_experiment_databases(db_files, master_db_path, label, description, manifest: MergeManifest):
+    return merge_generic_experiment_databases(
+        db_files, master_db_path, label, description, manifest, RangeImageExperiment, RangeImageFrameResult
     )
 
 
 def merge_generic_experiment_databases(
-        db_files, master_db_path, label, description, experiment_type: type[OrmEntity], frame_type: type[OrmEntity]
+        db_files, master_db_path, label, description, manifest: MergeManifest,
+        experiment_type: type[OrmEntity], frame_type: type[OrmEntity]
 ):
     with Database(master_db_path) as master_db:
         experiment = experiment_type(
             label=label,
             description=description,
             commit_hash=get_commit_hash(),
-            timestamp=SQLExpr("DATETIME('now', 'localtime', 'subsec')")
+            timestamp=SQLExpr(Constant.TIMESTAMP_EXPR)
         )
-        merged_experiment_id = experiment.save(master_db)
 
+        merged_experiment_id = manifest.experiment_id
         files_count = len(db_files)
         for file_index, db_file in enumerate(db_files):
             print(f"Merging {experiment_type.__table__} database {file_index + 1}/{files_count}")
 
-            with Database(db_file) as db:
-                frames = frame_type.all(db)
-                for frame in frames:
-                    frame.id = None
-                    frame.experiment_id = merged_experiment_id
+            with master_db.attached(db_file, Constant.PART_SCHEMA), master_db.transaction():
+                if merged_experiment_id is None:
+                    merged_experiment_id = experiment.save(master_db)
+
+                copy_frames_part(master_db, frame_type, merged_experiment_id)
+                manifest.record(master_db, db_file, merged_experiment_id)
 
-                frame_type.save_all(master_db, frames)
+    return merged_experiment_id
 
 
-def merge_ground_truth_databases(db_files, master_db_path):
+def merge_ground_truth_databases(db_files, master_db_path, manifest: MergeManifest):
     with Database(master_db_path) as master_db:
         files_count = len(db_files)
 
         for file_index, db_file in enumerate(db_files):
             print(f"Merging ground truth database {file_index + 1}/{files_count}")
 
-            with Database(db_file) as db:
-                frames = DatasetFrameGt.all(db)
-                scanlines = DatasetFrameScanlineGt.all(db)
+            with master_db.attached(db_file, Constant.PART_SCHEMA), master_db.transaction():
+                copy_ground_truth_part(master_db)
+                manifest.record(master_db, db_file, None)
+
+    return None
+
+
+def reduce_part_databases(db_files: list[str], merge_type: str, work_dir: str, workers: int) -> list[str]:
+    level = 0
+    while len(db_files) > 1:
+        level += 1
+        pairs = [
+            (db_files[i], db_files[i + 1], os.path.join(work_dir, f"level_{level}_{i // 2}.sqlite"))
+            for i in range(0, len(db_files) - 1, 2)
+        ]
+        unpaired_db_files = db_files[len(pairs) * 2:]
+
+        print(f"Merge level {level}: {len(db_files)} databases into {len(pairs) + len(unpaired_db_files)}")
+        start_time = time.time()
+        level_rows = 0
+
+        with multiprocessing.Pool(min(workers, len(pairs))) as pool:
+            # imap keeps the pair order, so rows end up in the same order as with a sequential merge
+            for pair_index, pair_rows in enumerate(pool.imap(partial(merge_part_pair, merge_type), pairs)):
+                level_rows += pair_rows
+                print(f" - Merged pair {pair_index + 1}/{len(pairs)}")
+
+        elapsed = time.time() - start_time
+        print(f"Merge level {level} done in {elapsed:.1f}s: {level_rows} rows, {level_rows / max(elapsed, 1e-6):.0f} rows/s")
+
+        for db_file in db_files:
+            if os.path.dirname(db_file) == work_dir:
+                os.remove(db_file)
+
+        db_files = [merged_db_file for _, _, merged_db_file in pairs] + unpaired_db_files
+
+    return db_files
+
+
+def merge_part_pair(merge_type: str, pair: tuple[str, str, str]) -> int:
+    first_db_file, second_db_file, merged_db_file = pair
+    shutil.copy(first_db_file, merged_db_file)
+
+    # part experiment ids are kept here, the final merge into the master assigns the merged experiment
+    with Database(merged_db_file) as db:
+        with db.attached(second_db_file, Constant.PART_SCHEMA), db.transaction():
+            return copy_part(db, merge_type)
+
+
+def copy_part(db: Database, merge_type: str, experiment_id: int | None = None) -> int:
+    if merge_type == Constant.ARG_EXPERIMENTS:
+        return copy_intrinsics_part(db, experiment_id)
+    elif merge_type == Constant.ARG_COMPRESSION_EXPERIMENTS:
+        return copy_frames_part(db, CompressionFrameResult, experiment_id)
+    elif merge_type == Constant.ARG_RI_EXPERIMENTS:
+        return copy_frames_part(db, RangeImageFrameResult, experiment_id)
+    elif merge_type == Constant.ARG_GROUND_TRUTH:
+        return copy_ground_truth_part(db)
+
+    raise ValueError(f"Unknown merge type: {merge_type}")
+
+
+def copy_intrinsics_part(db: Database, experiment_id: int | None = None) -> int:
+    # frame results keep their part ids shifted past the current ones, so scanlines follow with the same offset
+    params = {"offset": part_id_offset(db, IntrinsicsFrameResult), "experiment_id": experiment_id}
+    frame_expressions = {"id": "id + :offset"}
+    if experiment_id is not None:
+        frame_expressions["experiment_id"] = ":experiment_id"
+
+    frames_count = copy_part_rows(db, IntrinsicsFrameResult, frame_expressions, params)
+    scanlines_count = copy_part_rows(
+        db, IntrinsicsScanlineResult, {"intrinsics_result_id": "intrinsics_result_id + :offset"}, params
+    )
+
+    return frames_count + scanlines_count
+
+
+def copy_frames_part(db: Database, frame_type: type[OrmEntity], experiment_id: int | None = None) -> int:
+    if experiment_id is None:
+        return copy_part_rows(db, frame_type)
+
+    return copy_part_rows(db, frame_type, {"experiment_id": ":experiment_id"}, {"experiment_id": experiment_id})
+
+
+def copy_ground_truth_part(db: Database) -> int:
+    return copy_part_rows(db, DatasetFrameGt) + copy_part_rows(db, DatasetFrameScanlineGt)
+
+
+def copy_part_rows(db: Database, entity_type: type[OrmEntity], expressions: dict[str, str] = None, params: dict = None) -> int:
+    # columns without an expression are copied as they are, ids are only kept when an expression remaps them
+    expressions = expressions or {}
+    columns = (["id"] if "id" in expressions else []) + entity_type.__fields__
+    selected = [expressions.get(column, column) for column in columns]
+
+    table = entity_type.__table__
+    query = f"""
+        INSERT INTO main.{table} ({', '.join(columns)})
+        SELECT {', '.join(selected)} FROM {Constant.PART_SCHEMA}.{table} ORDER BY id
+    """
+    return db.execute(query, params or {}).rowcount
+
+
+def part_id_offset(db: Database, entity_type: type[OrmEntity]) -> int:
+    table = entity_type.__table__
+    query = f"""
+        SELECT COALESCE((SELECT MAX(id) FROM main.{table}), 0) - COALESCE((SELECT MIN(id) FROM {Constant.PART_SCHEMA}.{table}), 1) + 1
+    """
+    return db.execute(query).fetchone()[0]
+
 
-                for frame in frames:
-                    frame.id = None
+def part_stat(file_path: str) -> tuple[int, int]:
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
 
-                for scanline in scanlines:
-                    scanline.id = None
 
-                DatasetFrameGt.save_all(master_db, frames)
-                DatasetFrameScanlineGt.save_all(master_db, scanlines)
+def hash_file(file_path: str) -> str:
+    with open(file_path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
 
 
 def get_db_files(folder_path):
@@ -6,6 +6,8 @@ source ../../common/load_env.sh
 
 TARGET_DIR=""
 REMOVE_TARGET=false
+MERGE_WORKERS=1
+MERGE_SKIP_BACKUP=false
 
 while [[ $# -gt 0 ]]; do
   case "$1" in
@@ -22,6 +24,19 @@ while [[ $# -gt 0 ]]; do
       REMOVE_TARGET=true
       shift
       ;;
+    --workers)
+      shift
+      if [[ $# -eq 0 ]]; then
+        echo "Error: --workers requires a number argument." >&2
+        exit 1
+      fi
+      MERGE_WORKERS="$1"
+      shift
+      ;;
+    --skip-backup)
+      MERGE_SKIP_BACKUP=true
+      shift
+      ;;
     *)
       echo "Invalid arg: $1" >&2
       exit 1
@@ -41,6 +41,11 @@ if [[ ! -f "$MASTER_DB" ]]; then
   cp "${BASE_DB_DIR}/initial.sqlite" "$MASTER_DB"
 fi
 
+EXTRA_ARGS=()
+if [[ "$MERGE_SKIP_BACKUP" == true ]]; then
+  EXTRA_ARGS+=(--skip_backup)
+fi
+
 module load $ALICE_LRI_HPC_MODULES
 
 pushd "$PROJECT_ROOT" > /dev/null
@@ -48,7 +53,9 @@ apptainer run "$CONTAINER_PATH" \
   python -m scripts.merge.helper.merge_db "$TARGET_DIR" "$MASTER_DB" \
   --type="${ARG_TYPE}" \
   --label="$LABEL" \
-  --description="$DESCRIPTION"
+  --description="$DESCRIPTION" \
+  --workers="$MERGE_WORKERS" \
+  "${EXTRA_ARGS[@]}"
 popd > /dev/null
 
 echo "Experiments database merged successfully."
@@ -6,12 +6,15 @@ from scripts.common.helper.datasets.durlar import *
 from scripts.common.helper.datasets.kitti import *
 from scripts.common.helper.entities import *
 from scripts.common.helper.ground_truth import *
+from scripts.common.helper.frame_archive import FrameSource
+from scripts.common.helper.prefetch import prefetch
+from scripts.common.helper.work_queue import DEFAULT_CHUNK_FRAMES, FrameChunk, LeaseLostError, claim_frame_chunks
 
 
 class Config:
-    datasets: dict[str, tuple[Dataset, str]] = {
-        "kitti": (KITTI(), os.getenv("KITTI_PATH")),
-        "durlar": (DurLAR(), os.getenv("DURLAR_PATH")),
+    datasets: dict[str, tuple[Dataset, FrameSource]] = {
+        "kitti": (KITTI(), FrameSource(os.getenv("KITTI_PATH"), os.getenv("KITTI_ARCHIVE_PATH"))),
+        "durlar": (DurLAR(), FrameSource(os.getenv("DURLAR_PATH"), os.getenv("DURLAR_ARCHIVE_PATH"))),
     }
 
 
@@ -19,6 +22,10 @@ class Args:
     db_path: str
     process_id: int
     total_processes: int
+    mmap_frames: bool
+    prefetch: int
+    queue_dir: str | None
+    chunk_size: int
 
 
 def main():
@@ -27,30 +34,52 @@ def main():
         datasets = DatasetEntity.all(db)
         dataset_id_to_name = {dataset.id: dataset.name for dataset in datasets}
 
-        frames = DatasetFrame.where(db, "id % ? = ?", (Args.total_processes, Args.process_id))
-        print(f"Process {Args.process_id}/{Args.total_processes} - Assigned {len(frames)} frames")
+        frames_by_id = {frame.id: frame for frame in DatasetFrame.all(db)}
 
         laser_gts = DatasetLaserGt.all(db)
         laser_gts_by_dataset_and_idx = {(lg.dataset_id, lg.laser_idx): lg for lg in laser_gts}
 
-        all_frame_gt_entities = []
-        all_scanline_gt_entities = []
-        for i, frame in enumerate(frames):
-            print(f"Processing {frame.relative_path}")
+        processed_count = 0
+        chunks = claim_frame_chunks(Args.queue_dir, Args.process_id, Args.total_processes, sorted(frames_by_id), Args.chunk_size)
+        for chunk in chunks:
+            frames = [frames_by_id[frame_id] for frame_id in chunk.frame_ids]
+            print(f"Process {Args.process_id}/{Args.total_processes} - Claimed chunk {chunk.index} with {len(frames)} frames")
 
-            gt_result = compute_ground_truth_from_frame(frame, dataset_id_to_name)
-            gt_frame_entity = build_frame_gt_entity(frame.id, gt_result)
-            gt_scanline_entities = build_scanline_gt_entities(frame, gt_result, laser_gts_by_dataset_and_idx)
+            try:
+                frame_gt_entities, scanline_gt_entities = process_chunk(chunk, frames, dataset_id_to_name, laser_gts_by_dataset_and_idx)
 
-            all_frame_gt_entities.append(gt_frame_entity)
-            all_scanline_gt_entities.extend(gt_scanline_entities)
+                print(f"Process {Args.process_id}/{Args.total_processes} - Saving chunk {chunk.index}...")
+                with db.transaction():
+                    DatasetFrameGt.save_all(db, frame_gt_entities)
+                    DatasetFrameScanlineGt.save_all(db, scanline_gt_entities)
+                    # rolls the chunk back if another task took it over while its last frame was processed
+                    chunk.renew()
+                chunk.complete()
+            except LeaseLostError as e:
+                print(f"Process {Args.process_id}/{Args.total_processes} - {e}, discarding its results")
+                continue
 
-            print(f"Process {Args.process_id}/{Args.total_processes} - Processed {i + 1}/{len(frames)} frames")
+            processed_count += len(frames)
+            print(f"Process {Args.process_id}/{Args.total_processes} - Processed {processed_count} frames")
 
-        print(f"Process {Args.process_id}/{Args.total_processes} - Saving...")
-        DatasetFrameGt.save_all(db, all_frame_gt_entities)
-        DatasetFrameScanlineGt.save_all(db, all_scanline_gt_entities)
-        print(f"Process {Args.process_id}/{Args.total_processes} - Finished all {len(frames)} frames successfully")
+        print(f"Process {Args.process_id}/{Args.total_processes} - Finished all {processed_count} frames successfully")
+
+
+def process_chunk(chunk: FrameChunk, frames: list[DatasetFrame], dataset_id_to_name: dict[int, str],
+                  laser_gts_by_dataset_and_idx: dict[tuple[int, int], DatasetLaserGt]):
+    frame_gt_entities = []
+    scanline_gt_entities = []
+    load_frame = lambda f: load_frame_points(f, dataset_id_to_name)
+    for frame, points in prefetch(frames, load_frame, Args.prefetch):
+        print(f"Processing {frame.relative_path}")
+
+        gt_result = compute_ground_truth_from_frame(frame, points, dataset_id_to_name)
+        frame_gt_entities.append(build_frame_gt_entity(frame.id, gt_result))
+        scanline_gt_entities.extend(build_scanline_gt_entities(frame, gt_result, laser_gts_by_dataset_and_idx))
+
+        chunk.renew()
+
+    return frame_gt_entities, scanline_gt_entities
 
 
 def parse_args():
@@ -58,6 +87,11 @@ def parse_args():
     parser.add_argument('process_id', type=int, help='ID of the current process (0-indexed)')
     parser.add_argument('total_processes', type=int, help='Total number of processes')
     parser.add_argument('--db_path', type=str, required=True, help='Path to the SQLite database')
+    parser.add_argument('--mmap_frames', action='store_true', help='Memory-map frames instead of reading them into memory')
+    parser.add_argument('--prefetch', type=int, default=4, help='Number of frames loaded ahead in the background (0 disables)')
+    parser.add_argument('--queue_dir', type=str, default=None,
+                        help='Shared directory the processes claim chunks of frames from (defaults to a static split by frame id)')
+    parser.add_argument('--chunk_size', type=int, default=DEFAULT_CHUNK_FRAMES, help='Number of frames claimed at once')
     args = parser.parse_args()
 
     assert os.path.exists(args.db_path), f"Database path does not exist: {args.db_path}"
@@ -65,17 +99,23 @@ def parse_args():
     Args.db_path = args.db_path
     Args.process_id = args.process_id
     Args.total_processes = args.total_processes
+    Args.mmap_frames = args.mmap_frames
+    Args.prefetch = args.prefetch
+    Args.queue_dir = args.queue_dir
+    Args.chunk_size = args.chunk_size
 
 
-def compute_ground_truth_from_frame(frame: DatasetFrame, dataset_id_to_name: dict[int, str]):
-    dataset_name = dataset_id_to_name[frame.dataset_id]
-    dataset_data, base_path = Config.datasets[dataset_name]
-    points, _ = load_binary(os.path.join(base_path, frame.relative_path))
-    points = points[calculate_range(points) > 0]
+def load_frame_points(frame: DatasetFrame, dataset_id_to_name: dict[int, str]):
+    _, frame_source = Config.datasets[dataset_id_to_name[frame.dataset_id]]
+    points = frame_source.load_points(frame.relative_path, mmap=Args.mmap_frames)
 
-    _, gt_result = compute_ground_truth(
-        points, dataset_data.v_angles, dataset_data.v_offsets, dataset_data.h_offsets, dataset_data.h_resolutions
-    )
+    return points
+
+
+def compute_ground_truth_from_frame(frame: DatasetFrame, points, dataset_id_to_name: dict[int, str]):
+    dataset_data, _ = Config.datasets[dataset_id_to_name[frame.dataset_id]]
+
+    _, gt_result = compute_ground_truth(points, dataset_data.intrinsics)
 
     return gt_result
 
@@ -9,7 +9,7 @@ source ../helper/prepare_task_item.sh
 
 echo "Running task $TASK_INDEX of $TASK_COUNT..."
 pushd "${PROJECT_ROOT}" > /dev/null
-python -m scripts.slurm.ground_truth.populate_ground_truth_db "$TASK_INDEX" "$TASK_COUNT" --db_path="${DB_FILE_PATH}" | tee "${TRACE_FILE_PATH}"
+python -m scripts.slurm.ground_truth.populate_ground_truth_db "$TASK_INDEX" "$TASK_COUNT" --db_path="${DB_FILE_PATH}" --queue_dir="${QUEUE_DIR}" | tee "${TRACE_FILE_PATH}"
 popd > /dev/null
 
 touch "${SUCCESS_FILE_PATH}"
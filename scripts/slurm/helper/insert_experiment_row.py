@@ -12,7 +12,7 @@ def main():
     parser.add_argument("--build-options", type=str, help="Build options string (e.g., '-Dflag1=ON -Dflag2=OFF')")
     args = parser.parse_args()
 
-    with Database(args.db_path) as db:
+    with Database(args.db_path) as db, db.transaction():
         if args.type == 'intrinsics':
             build_options = {
                 "use_hough_continuity": True,
@@ -6,6 +6,7 @@ SUCCESS_FILE_PATH="${DB_DIR}/task_${TASK_INDEX}.success"
 TRACE_FOLDER_PATH="${DB_DIR}/traces"
 TRACE_FILE_PATH="${TRACE_FOLDER_PATH}/${TASK_INDEX}.log"
 PRIVATE_DIR="${DB_DIR}/private/${TASK_INDEX}"
+QUEUE_DIR="${DB_DIR}/queue"
 
 rm -f "${DB_FILE_PATH}"
 rm -f "${SUCCESS_FILE_PATH}"
@@ -27,6 +27,8 @@ srun apptainer run "$CONTAINER_PATH" \
  --db_path="${DB_DIR}/initial.sqlite" \
  --kitti_root="${KITTI_PATH}" \
  --durlar_root="${DURLAR_PATH}" \
+ --kitti_archive="${KITTI_ARCHIVE_PATH}" \
+ --durlar_archive="${DURLAR_ARCHIVE_PATH}" \
  --private_dir="${TMPDIR}" \
  --shared_dir="${SHARED_DIR}"
 popd > /dev/null
@@ -1,15 +1,22 @@
+import multiprocessing
 import os
 import re
 import sqlite3
 import subprocess
+import threading
+from contextlib import nullcontext
+from functools import partial
 
 import pandas as pd
-import open3d as o3d
 import argparse
 import alice_lri
 
 from scripts.common.helper.ri.ri_utils import *
 from scripts.common.helper.ri.ri_default_mapper import *
+from scripts.common.helper.frame_archive import FrameSource
+from scripts.common.helper.prefetch import prefetch
+from scripts.common.helper.point_cloud_errors import PointCloudErrors
+from scripts.common.helper.work_queue import DEFAULT_CHUNK_FRAMES, FrameChunk, LeaseLostError, claim_frame_chunks
 
 from scripts.common.load_env import load_env
 load_env()
@@ -24,7 +31,11 @@ class Config:
     tile_size = "4"
     error_thresholds = [0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 1]
     ri_size_multipliers = [1, 2, 4, 8, 16, 32]
+    collision_mode = "last"
     methods = ["naive", "accurate"]
+    mmap_frames = False
+    prefetch_depth = 4
+    workers = 1
     private_dir = "/tmp"
     shared_dir = "/tmp"
     dataset = None
@@ -64,19 +75,7 @@ class Config:
 
 class Globals:
     env = None
-
-def compute_p_cloud_errors(pc1, pc2):
-    pcd1 = o3d.geometry.PointCloud()
-    pcd2 = o3d.geometry.PointCloud()
-
-    pcd1.points = o3d.utility.Vector3dVector(pc1)
-    pcd2.points = o3d.utility.Vector3dVector(pc2)
-
-    dists1 = pcd1.compute_point_cloud_distance(pcd2)
-    dists2 = pcd2.compute_point_cloud_distance(pcd1)
-
-    return np.mean(np.array(dists1)), np.mean(np.array(dists2)), np.mean(np.array(dists1)**2), np.mean(np.array(dists2)**2)
-
+    frame_sources: dict[str, FrameSource] = {}
 
 def run_process(cmd):
     subprocess.run(cmd, check=True, cwd=Config.private_dir, env=Globals.env)
@@ -97,6 +96,10 @@ def get_frame_path(args, dataset, relative_path):
     return frame_path
 
 
+def load_dataset_frame(dataset, frame_path):
+    return Globals.frame_sources[dataset].load_path_points(frame_path, mmap=Config.mmap_frames)
+
+
 def build_naive_encoder_cmd(input_dir, input_file, output_file, error_threshold):
     return [
         os.path.abspath(Config.original_encoder_exec),
@@ -145,35 +148,31 @@ def build_accurate_decoder_cmd(input_file, intrinsics_file):
     ]
 
 
-def estimate_intrinsics(estimate_cloud_path, intrinsics_filename):
-    print("Loading estimation cloud points from:", estimate_cloud_path)
-    estimation_points, _ = load_binary(estimate_cloud_path)
-
-    print("Estimating intrinsics...")
+def estimate_intrinsics(estimate_cloud_path, estimation_points, intrinsics_filename):
+    print("Estimating intrinsics from:", estimate_cloud_path)
     intrinsics = alice_lri.estimate_intrinsics(estimation_points[:, 0], estimation_points[:, 1], estimation_points[:, 2])
 
     intrinsics_file = os.path.join(Config.shared_dir, intrinsics_filename)
     alice_lri.intrinsics_to_json_file(intrinsics, intrinsics_file)
 
 
-def evaluate_ri(dataset, target_path, intrinsics_filename):
+def evaluate_ri(dataset, target_path, points_original, intrinsics_filename):
     Config.dataset = dataset
     intrinsics_file = os.path.join(Config.shared_dir, intrinsics_filename)
     df_rows = []
 
-    print("Loading original points from:", target_path)
-    points_original, _ = load_binary(target_path)
+    print("Evaluating original points from:", target_path)
     x_original, y_original, z_original = points_original[:, 0], points_original[:, 1], points_original[:, 2]
 
     intrinsics = alice_lri.intrinsics_from_json_file(intrinsics_file)
+    p_cloud_errors = PointCloudErrors(points_original)
 
     print("Evaluating accurate method...")
     ri_accurate = alice_lri.project_to_range_image(intrinsics, x_original, y_original, z_original)
     x_accurate, y_accurate, z_accurate = alice_lri.unproject_to_point_cloud(intrinsics, ri_accurate)
 
     points_accurate = np.column_stack((x_accurate, y_accurate, z_accurate))
-    accurate_to_original_rmse, original_to_accurate_rmse, accurate_to_original_mse, original_to_accurate_mse =\
-        compute_p_cloud_errors(points_accurate, points_original)
+    accurate_to_original, original_to_accurate = p_cloud_errors.compute(points_accurate)
 
     df_rows.append({
         "method": "accurate",
@@ -181,25 +180,23 @@ def evaluate_ri(dataset, target_path, intrinsics_filename):
         "ri_height": ri_accurate.height,
         "original_points_count": points_original.shape[0],
         "reconstructed_points_count": points_accurate.shape[0],
-        "reconstructed_to_original_rmse": accurate_to_original_rmse,
-        "original_to_reconstructed_rmse": original_to_accurate_rmse,
-        "reconstructed_to_original_mse": accurate_to_original_mse,
-        "original_to_reconstructed_mse": original_to_accurate_mse,
+        "reconstructed_to_original_rmse": accurate_to_original.mean,
+        "original_to_reconstructed_rmse": original_to_accurate.mean,
+        "reconstructed_to_original_mse": accurate_to_original.mse,
+        "original_to_reconstructed_mse": original_to_accurate.mse,
     })
 
-    for ri_size_multiplier in Config.ri_size_multipliers:
-        ri_width = ri_accurate.width * ri_size_multiplier
-        ri_height = ri_accurate.height * ri_size_multiplier
-
-        print(f"Evaluating PBEA method ({ri_width}x{ri_height})...")
-
-        ri_mapper = RangeImageDefaultMapper(ri_width, ri_height)
+    print("Evaluating PBEA method...")
+    ri_mappers = [
+        RangeImageDefaultMapper(ri_accurate.width * ri_size_multiplier, ri_accurate.height * ri_size_multiplier)
+        for ri_size_multiplier in Config.ri_size_multipliers
+    ]
 
-        pbea_ri = point_cloud_to_range_image(ri_mapper, points_original)
-        points_pbea = range_image_to_point_cloud(ri_mapper, pbea_ri)
+    for ri_mapper, points_pbea in zip(ri_mappers, range_image_round_trips(ri_mappers, points_original, Config.collision_mode)):
+        ri_width, ri_height = ri_mapper.w, ri_mapper.h
+        print(f"Computing PBEA metrics ({ri_width}x{ri_height}, {ri_mapper.collisions} collisions)...")
 
-        pbea_to_original_rmse, original_to_pbea_rmse, pbea_to_original_mse, original_to_pbea_mse =\
-            compute_p_cloud_errors(points_pbea, points_original)
+        pbea_to_original, original_to_pbea = p_cloud_errors.compute(points_pbea)
 
         df_rows.append({
             "method": "pbea",
@@ -207,25 +204,26 @@ def evaluate_ri(dataset, target_path, intrinsics_filename):
             "ri_height": ri_height,
             "original_points_count": points_original.shape[0],
             "reconstructed_points_count": points_pbea.shape[0],
-            "reconstructed_to_original_rmse": pbea_to_original_rmse,
-            "original_to_reconstructed_rmse": original_to_pbea_rmse,
-            "reconstructed_to_original_mse": pbea_to_original_mse,
-            "original_to_reconstructed_mse": original_to_pbea_mse,
+            "reconstructed_to_original_rmse": pbea_to_original.mean,
+            "original_to_reconstructed_rmse": original_to_pbea.mean,
+            "reconstructed_to_original_mse": pbea_to_original.mse,
+            "original_to_reconstructed_mse": original_to_pbea.mse,
         })
 
     return pd.DataFrame(df_rows)
 
 
-def evaluate_compression(dataset, target_path, intrinsics_filename, out_filename):
+def evaluate_compression(dataset, target_path, target_points, intrinsics_filename, out_filename):
     Config.dataset = dataset
     target_dir = os.path.dirname(target_path)
     target_filename = os.path.basename(target_path)
     intrinsics_file = os.path.join(Config.shared_dir, intrinsics_filename)
     df_rows = []
 
-    print("Loading target points from:", target_path)
-    target_points, _ = load_binary(target_path)
+    print("Evaluating target points from:", target_path)
     original_size = get_file_size(target_path)
+    p_cloud_errors = PointCloudErrors(target_points)
+
     for error_threshold in Config.error_thresholds:
         print(f"Error threshold: {error_threshold}")
 
@@ -247,19 +245,18 @@ def evaluate_compression(dataset, target_path, intrinsics_filename, out_filename
             cr_naive = original_size / naive_size
 
             print("Computing naive metrics...")
-            naive_to_original_rmse, original_to_naive_rmse, naive_to_original_mse, original_to_naive_mse =\
-                compute_p_cloud_errors(naive_points, target_points)
+            naive_to_original, original_to_naive = p_cloud_errors.compute(naive_points)
 
             print(f"Compression Ratio (Naive): {cr_naive}")
-            print(f"MSE (Naive to Original): {naive_to_original_mse}")
-            print(f"MSE (Original to Naive): {original_to_naive_mse}")
+            print(f"MSE (Naive to Original): {naive_to_original.mse}")
+            print(f"MSE (Original to Naive): {original_to_naive.mse}")
 
             current_df_row["naive_points_count"] = naive_points.shape[0]
             current_df_row["naive_size_bytes"] = naive_size
-            current_df_row["naive_to_original_rmse"] = naive_to_original_rmse
-            current_df_row["original_to_naive_rmse"] = original_to_naive_rmse
-            current_df_row["naive_to_original_mse"] = naive_to_original_mse
-            current_df_row["original_to_naive_mse"] = original_to_naive_mse
+            current_df_row["naive_to_original_rmse"] = naive_to_original.mean
+            current_df_row["original_to_naive_rmse"] = original_to_naive.mean
+            current_df_row["naive_to_original_mse"] = naive_to_original.mse
+            current_df_row["original_to_naive_mse"] = original_to_naive.mse
 
         if "accurate" in Config.methods:
             print("Accurate encoding...")
@@ -277,19 +274,18 @@ def evaluate_compression(dataset, target_path, intrinsics_filename, out_filename
             cr_accurate = original_size / accurate_size
 
             print("Computing accurate metrics...")
-            accurate_to_original_rmse, original_to_accurate_rmse, accurate_to_original_mse, original_to_accurate_mse =\
-                compute_p_cloud_errors(accurate_points, target_points)
+            accurate_to_original, original_to_accurate = p_cloud_errors.compute(accurate_points)
 
             print(f"Compression Ratio (Accurate): {cr_accurate}")
-            print(f"MSE (Accurate to Original): {accurate_to_original_mse}")
-            print(f"MSE (Original to Accurate): {original_to_accurate_mse}")
+            print(f"MSE (Accurate to Original): {accurate_to_original.mse}")
+            print(f"MSE (Original to Accurate): {original_to_accurate.mse}")
 
             current_df_row["accurate_points_count"] = accurate_points.shape[0]
             current_df_row["accurate_size_bytes"] = accurate_size
-            current_df_row["accurate_to_original_rmse"] = accurate_to_original_rmse
-            current_df_row["original_to_accurate_rmse"] = original_to_accurate_rmse
-            current_df_row["accurate_to_original_mse"] = accurate_to_original_mse
-            current_df_row["original_to_accurate_mse"] = original_to_accurate_mse
+            current_df_row["accurate_to_original_rmse"] = accurate_to_original.mean
+            current_df_row["original_to_accurate_rmse"] = original_to_accurate.mean
+            current_df_row["accurate_to_original_mse"] = accurate_to_original.mse
+            current_df_row["original_to_accurate_mse"] = original_to_accurate.mse
 
         current_df_row["horizontal_step"] = Config.get_horizontal_step()
         current_df_row["vertical_step"] = Config.get_vertical_step()
@@ -303,11 +299,11 @@ def evaluate_compression(dataset, target_path, intrinsics_filename, out_filename
     return pd.DataFrame(df_rows)
 
 
-def evaluate(dataset, frame_path, intrinsics_filename, compression_out_filename):
+def evaluate(dataset, frame_path, points, intrinsics_filename, compression_out_filename):
     if Config.experiment_type == "ri":
-        return evaluate_ri(dataset, frame_path, intrinsics_filename)
+        return evaluate_ri(dataset, frame_path, points, intrinsics_filename)
     elif Config.experiment_type == "compression":
-        return evaluate_compression(dataset, frame_path, intrinsics_filename, compression_out_filename)
+        return evaluate_compression(dataset, frame_path, points, intrinsics_filename, compression_out_filename)
     else:
         raise ValueError(f"Unknown experiment type: {Config.experiment_type}")
 
@@ -321,9 +317,11 @@ def run_single(args):
     intrinsics_filename = "intrinsics.json"
     compression_out_filename = "out.tar.gz"
 
-    estimate_intrinsics(estimate_path, intrinsics_filename)
+    estimation_points = load_dataset_frame(estimate_parts[0], estimate_path)
+    estimate_intrinsics(estimate_path, estimation_points, intrinsics_filename)
 
-    df = evaluate(target_parts[0], target_path, intrinsics_filename, compression_out_filename)
+    target_points = load_dataset_frame(target_parts[0], target_path)
+    df = evaluate(target_parts[0], target_path, target_points, intrinsics_filename, compression_out_filename)
 
     df["estimate_dataset"] = estimate_parts[0]
     df["estimate_path"] = estimate_parts[1]
@@ -361,34 +359,129 @@ def run_batch(args):
         frames_query = f"""
             SELECT id, dataset_id, relative_path
             FROM dataset_frame
-            WHERE id % ? == ?
-            AND dataset_id IN ({placeholders})
+            WHERE dataset_id IN ({placeholders})
             AND relative_path LIKE ?
+            ORDER BY id
         """
 
-        cur.execute(frames_query, (args.task_count, args.task_id, *dataset_ids, path_filter))
-        frames = cur.fetchall()
+        cur.execute(frames_query, (*dataset_ids, path_filter))
+        frames_by_id = {
+            frame_id: (frame_id, dataset_map[dataset_id], relative_path)
+            for frame_id, dataset_id, relative_path in cur.fetchall()
+        }
+
+        print(f"Number of frames: {len(frames_by_id)}")
+
+        if args.phase == "estimate":
+            frames = list(frames_by_id.values())
+            for (_, dataset, relative_path), points in prefetch(frames, partial(load_batch_frame, args), Config.prefetch_depth):
+                intrinsics_filename = f"{relative_path.replace("/", "_")}.json"
+                estimate_intrinsics(get_frame_path(args, dataset, relative_path), points, intrinsics_filename)
+            return
+
+        if Config.workers > 1:
+            print(f"Evaluating with {Config.workers} workers")
+
+        # the workers are forked once and reused by every chunk the task claims
+        with create_evaluate_pool() as pool:
+            chunks = claim_frame_chunks(args.queue_dir, args.task_id, args.task_count, list(frames_by_id), args.chunk_size)
+            for chunk in chunks:
+                frames = [frames_by_id[frame_id] for frame_id in chunk.frame_ids]
+                print(f"Claimed chunk {chunk.index} with {len(frames)} frames")
+
+                try:
+                    df = evaluate_batch_chunk(args, chunk, frames, pool)
+
+                    # a single transaction, so a task that dies midway leaves no partial chunk behind. The lease is
+                    # renewed right before it, so another task cannot take the chunk over until it is marked done
+                    chunk.renew()
+                    df["experiment_id"] = experiment_id
+                    df.to_sql(Config.get_result_sql_table(), conn, if_exists="append", index=False)
+                    chunk.complete()
+                except LeaseLostError as e:
+                    print(f"{e}, discarding its results")
+                    continue
+
+
+def evaluate_batch_chunk(args, chunk: FrameChunk, frames, pool=None) -> pd.DataFrame:
+    # the pool outlives the chunk, so at most one frame per worker is submitted at a time and a chunk whose lease is
+    # lost stops submitting, leaving only the frames already running to be drained before the next chunk
+    slots = threading.Semaphore(Config.workers)
+    cancelled = threading.Event()
+
+    def stop_submitting():
+        cancelled.set()
+        slots.release()
+
+    if pool is not None:
+        results = pool.imap_unordered(partial(evaluate_batch_frame_in_worker, args), submit_frames(frames, slots, cancelled))
+    else:
+        loaded_frames = prefetch(frames, partial(load_batch_frame, args), Config.prefetch_depth)
+        results = (evaluate_batch_frame(args, frame, points) for frame, points in loaded_frames)
+
+    dfs = []
+    try:
+        for frame_id, df in results:
+            slots.release()
+            df["dataset_frame_id"] = frame_id
+            dfs.append(df)
+            chunk.renew()
+    except LeaseLostError:
+        stop_submitting()
+        for _ in results:
+            pass
+        raise
+    finally:
+        # otherwise the pool task handler would stay blocked in submit_frames after an error
+        stop_submitting()
+
+    return pd.concat(dfs, ignore_index=True)
+
 
-        print(f"Number of frames: {len(frames)}")
+def submit_frames(frames, slots: threading.Semaphore, cancelled: threading.Event):
+    for frame in frames:
+        slots.acquire()
+        if cancelled.is_set():
+            return
+        yield frame
 
-        for frame_id, dataset_id, relative_path in frames:
-            dataset = dataset_map[dataset_id]
-            frame_path = get_frame_path(args, dataset, relative_path)
-            derived_filename = relative_path.replace("/", "_")
 
-            if args.phase == "estimate":
-                intrinsics_filename = f"{derived_filename}.json"
-                estimate_intrinsics(frame_path, intrinsics_filename)
-            elif args.phase == "evaluate":
-                corresponding_estimate_derived_filename = re.sub(r"\d{10}\.bin$", "0000000000.bin", derived_filename)
-                intrinsics_filename = f"{corresponding_estimate_derived_filename}.json"
-                compression_out_filename = f"{derived_filename}.tar.gz"
+def load_batch_frame(args, frame):
+    _, dataset, relative_path = frame
+    points = load_dataset_frame(dataset, get_frame_path(args, dataset, relative_path))
 
-                df = evaluate(dataset, frame_path, intrinsics_filename, compression_out_filename)
-                df["experiment_id"] = experiment_id
-                df["dataset_frame_id"] = frame_id
+    return points
 
-                df.to_sql(Config.get_result_sql_table(), conn, if_exists="append", index=False)
+
+def evaluate_batch_frame(args, frame, points):
+    frame_id, dataset, relative_path = frame
+    frame_path = get_frame_path(args, dataset, relative_path)
+    derived_filename = relative_path.replace("/", "_")
+
+    corresponding_estimate_derived_filename = re.sub(r"\d{10}\.bin$", "0000000000.bin", derived_filename)
+    intrinsics_filename = f"{corresponding_estimate_derived_filename}.json"
+    compression_out_filename = f"{derived_filename}.tar.gz"
+
+    return frame_id, evaluate(dataset, frame_path, points, intrinsics_filename, compression_out_filename)
+
+
+def evaluate_batch_frame_in_worker(args, frame):
+    return evaluate_batch_frame(args, frame, load_batch_frame(args, frame))
+
+
+def init_evaluate_worker():
+    # the RTST decoders write into the private dir using the frame file name, so workers must not share it
+    Config.private_dir = os.path.join(Config.private_dir, f"worker_{os.getpid()}")
+    os.makedirs(Config.private_dir, exist_ok=True)
+
+
+def create_evaluate_pool():
+    if Config.workers <= 1:
+        return nullcontext()
+
+    # fork so that workers inherit the Config and Globals set up from the command line
+    context = multiprocessing.get_context("fork")
+    return context.Pool(Config.workers, initializer=init_evaluate_worker)
 
 
 def parse_args():
@@ -398,6 +491,8 @@ def parse_args():
     parser.add_argument("--type", default=None, choices=["ri", "compression"], help="What do with the range image, just project and unproject (ri) or compress (compress).")
     parser.add_argument("--task_id", type=int, default=None, help="Task ID (batch mode).")
     parser.add_argument("--task_count", type=int, default=None, help="Task count (batch mode).")
+    parser.add_argument("--queue_dir", type=str, default=None, help="Shared directory the tasks claim chunks of frames from (batch mode, defaults to a static split by frame id).")
+    parser.add_argument("--chunk_size", type=int, default=DEFAULT_CHUNK_FRAMES, help="Number of frames claimed at once from the queue (batch mode).")
     parser.add_argument("--db_path", type=str, default=None, help="Path to the database file (batch mode).")
     parser.add_argument("--estimate", type=str, default=None, help="Estimation cloud path (single mode).")
     parser.add_argument("--target", type=str, default=None, help="Target path (single mode).")
@@ -405,10 +500,16 @@ def parse_args():
     parser.add_argument("--kitti_root", type=str, default=None, help="Path to KITTI dataset root directory (optional).")
     parser.add_argument("--durlar_root", type=str, default=None,
                         help="Path to DURLAR dataset root directory (optional).")
+    parser.add_argument("--kitti_archive", type=str, default=None, help="Path to packed KITTI frame archives (optional).")
+    parser.add_argument("--durlar_archive", type=str, default=None, help="Path to packed DURLAR frame archives (optional).")
     parser.add_argument("--private_dir", type=str, default=None, help="Optional private directory for intermediate files.")
     parser.add_argument("--shared_dir", type=str, default=None, help="Optional shared directory for intermediate files.")
     parser.add_argument("--error_thresholds", type=float, nargs='+', default=None, help="List of error thresholds (overrides default).")
     parser.add_argument("--methods", type=str, nargs='+', default=None, help="List of methods to use (overrides default).")
+    parser.add_argument("--collision_mode", default=None, choices=["last", "first", "nearest", "farthest"], help="Which point keeps a PBEA range image pixel shared by several points.")
+    parser.add_argument("--mmap_frames", action="store_true", help="Memory-map dataset frames instead of reading them into memory.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of local worker processes evaluating frames (batch mode).")
+    parser.add_argument("--prefetch", type=int, default=None, help="Number of frames loaded ahead in the background (batch mode, 0 disables).")
 
     args = parser.parse_args()
 
@@ -423,6 +524,17 @@ def parse_args():
     if args.methods is not None:
         Config.methods = args.methods
 
+    if args.collision_mode is not None:
+        Config.collision_mode = args.collision_mode
+
+    Config.mmap_frames = args.mmap_frames
+
+    if args.prefetch is not None:
+        Config.prefetch_depth = args.prefetch
+
+    if args.workers is not None:
+        Config.workers = args.workers
+
     if args.mode == "batch":
         if args.db_path is None or args.phase is None:
             parser.error("--db_path and --phase are required in batch mode.")
@@ -462,6 +574,11 @@ def main():
     Globals.env = os.environ.copy()
     Globals.env["LD_LIBRARY_PATH"] = os.path.abspath(Config.alice_lri_lib_path)
 
+    Globals.frame_sources = {
+        "kitti": FrameSource(args.kitti_root, args.kitti_archive),
+        "durlar": FrameSource(args.durlar_root, args.durlar_archive),
+    }
+
     if args.mode == "single":
         run_single(args)
     elif args.mode == "batch":
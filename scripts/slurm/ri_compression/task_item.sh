@@ -10,9 +10,9 @@ ARG_TYPE=$5
 source ../helper/prepare_task_item.sh
 
 DATASETS_ARGS=()
-DATASETS_ARGS+=("--kitti_root=${KITTI_PATH}")
+DATASETS_ARGS+=("--kitti_root=${KITTI_PATH}" "--kitti_archive=${KITTI_ARCHIVE_PATH}")
 if [[ "${ARG_TYPE}" == "ri" ]]; then
-  DATASETS_ARGS+=("--durlar_root=${DURLAR_PATH}")
+  DATASETS_ARGS+=("--durlar_root=${DURLAR_PATH}" "--durlar_archive=${DURLAR_ARCHIVE_PATH}")
 fi
 
 echo "Running task $TASK_INDEX of $TASK_COUNT..."
@@ -22,10 +22,12 @@ python -u -m scripts.slurm.ri_compression.run_ri_experiment --mode batch \
   --type="${ARG_TYPE}" \
   --task_id="$TASK_INDEX" \
   --task_count="$TASK_COUNT" \
+  --queue_dir="${QUEUE_DIR}" \
   --db_path="${DB_FILE_PATH}" \
   "${DATASETS_ARGS[@]}" \
   --private_dir="${PRIVATE_DIR}" \
-  --shared_dir="${SHARED_DIR}" 2>&1 | tee "${TRACE_FILE_PATH}"
+  --shared_dir="${SHARED_DIR}" \
+  --workers="${SLURM_CPUS_PER_TASK:-1}" 2>&1 | tee "${TRACE_FILE_PATH}"
 popd > /dev/null
 
 touch "${SUCCESS_FILE_PATH}"
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from scripts.common.helper.datasets.kitti import KITTI
+from scripts.common.helper.ground_truth import compute_ground_truth
+from scripts.common.helper.point_cloud import calculate_phi, calculate_range, calculate_range_xy, calculate_theta, \
+    calculate_xyz
+
+
+def synthetic_cloud(dataset, points_count=50000, seed=0):
+    rng = np.random.default_rng(seed)
+    intrinsics = dataset.intrinsics
+    laser_indices = rng.integers(0, dataset.laser_count, points_count)
+
+    r = rng.uniform(2, dataset.max_range, points_count)
+    phi = intrinsics.v_angles[laser_indices] + np.arcsin(intrinsics.v_offsets[laser_indices] / r)
+    phi += rng.uniform(-1e-4, 1e-4, points_count)
+
+    theta_steps = intrinsics.theta_steps[laser_indices]
+    theta = (rng.integers(-2000, 2000, points_count) + 0.3) * theta_steps
+    theta += np.arcsin(intrinsics.h_offsets[laser_indices] / (r * np.cos(phi)))
+
+    return calculate_xyz(phi, theta, r).astype(np.float32)
+
+
+def reference_ground_truth(points, v_angles, v_offsets, h_offsets, h_resolutions, threshold=5e-4):
+    # per-laser loop from before the candidate windows
+    phis = calculate_phi(points)
+    thetas = calculate_theta(points)
+    ranges = calculate_range(points)
+    ranges_xy = calculate_range_xy(points)
+    scanlines_ids = np.full(len(points), -1, dtype=int)
+    theta_offsets = {}
+
+    for laser_idx in range(len(v_offsets)):
+        phi_correction = np.arcsin(v_offsets[laser_idx] / ranges)
+        idx = np.where(np.abs(phis - phi_correction - v_angles[laser_idx]) < threshold)[0]
+        if len(idx) == 0:
+            continue
+
+        scanlines_ids[idx] = laser_idx
+
+        theta_step = 2 * np.pi / h_resolutions[laser_idx]
+        corrected_thetas = thetas[idx] - np.arcsin(h_offsets[laser_idx] / ranges_xy[idx])
+        ideal_thetas = np.floor(corrected_thetas / theta_step) * theta_step
+        theta_offsets[laser_idx] = float(np.mean(corrected_thetas - ideal_thetas))
+
+    return scanlines_ids, theta_offsets
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_compute_ground_truth_matches_reference(dtype):
+    dataset = KITTI()
+    points = synthetic_cloud(dataset).astype(dtype)
+
+    scanlines_ids, result = compute_ground_truth(points, dataset.intrinsics)
+    expected_ids, expected_offsets = reference_ground_truth(
+        points, dataset.v_angles, dataset.v_offsets, dataset.h_offsets, dataset.h_resolutions
+    )
+
+    np.testing.assert_array_equal(scanlines_ids, expected_ids)
+    assert {scanline['laser_idx']: scanline['theta_offset'] for scanline in result['scanlines']} == expected_offsets
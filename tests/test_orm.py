@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from scripts.common.helper.orm import Database, OrmEntity
+
+
+class Sample(OrmEntity, table_name="sample"):
+    id: int | None
+    name: str
+    value: float
+
+
+@pytest.fixture
+def db(tmp_path):
+    with Database(str(tmp_path / "test.sqlite")) as db:
+        Sample.create_table(db)
+        Sample.save_all(db, [Sample(name=f"s{i}", value=i / 2) for i in range(25)])
+        yield db
+
+
+def test_iter_where_rejects_array_projection_on_call(db):
+    with pytest.raises(ValueError):
+        Sample.iter_where(db, "1", projection="array")
+
+
+def test_iter_chunks_rejects_unknown_projection_on_call(db):
+    with pytest.raises(ValueError):
+        Sample.iter_chunks(db, projection="dict")
+
+
+def test_iter_where_and_iter_chunks_read_every_row(db):
+    samples = list(Sample.iter_where(db, "value >= ?", (5,), chunk_size=4))
+    assert [sample.name for sample in samples] == [f"s{i}" for i in range(10, 25)]
+
+    tuples = list(Sample.iter_all(db, chunk_size=4, projection="tuple"))
+    assert tuples[3].value == 1.5
+
+    chunks = list(Sample.iter_chunks(db, chunk_size=10, projection="array"))
+    assert [chunk.shape[0] for chunk in chunks] == [10, 10, 5]
+    np.testing.assert_array_equal(np.concatenate(chunks)["value"], np.arange(25) / 2)
+
+
+class NullableSample(OrmEntity, table_name="nullable_sample"):
+    id: int | None
+    count: int
+    parent_id: int | None
+
+
+def test_array_projection_reads_nullable_int_as_nan(db):
+    NullableSample.create_table(db)
+    NullableSample.save_all(db, [NullableSample(count=1, parent_id=3), NullableSample(count=2, parent_id=None)])
+
+    array = next(NullableSample.iter_chunks(db, projection="array"))
+    assert array["id"].dtype == np.int64
+    np.testing.assert_array_equal(array["parent_id"], [3, np.nan])
+
+
+def test_array_projection_rejects_null_in_int_column(db):
+    NullableSample.create_table(db)
+    NullableSample.save_all(db, [NullableSample(count=None, parent_id=1)])
+
+    with pytest.raises(ValueError, match="int \\| None"):
+        next(NullableSample.iter_chunks(db, projection="array"))
@@ -0,0 +1,40 @@
+import numpy as np
+
+from scripts.common.helper.point_cloud import load_binary, map_binary
+
+
+def write_frame(path, data):
+    np.asarray(data, dtype=np.float32).tofile(path)
+    return str(path)
+
+
+def test_mapped_frame_without_zero_ranges_is_not_copied(tmp_path):
+    frame_path = write_frame(tmp_path / "frame.bin", np.random.default_rng(0).uniform(1, 10, (100, 4)))
+    frame = map_binary(frame_path)
+
+    points, intensity = frame.points, frame.intensity
+
+    assert np.shares_memory(points, frame.data)
+    assert np.shares_memory(intensity, frame.data)
+    np.testing.assert_array_equal(points, load_binary(frame_path)[0])
+
+
+def test_mapped_frame_drops_zero_ranges_like_loaded_frame(tmp_path):
+    data = np.random.default_rng(0).uniform(1, 10, (100, 4))
+    data[[3, 50], :3] = 0
+    frame_path = write_frame(tmp_path / "frame.bin", data)
+    frame = map_binary(frame_path)
+
+    expected_points, expected_intensity = load_binary(frame_path)
+
+    assert frame.points.shape[0] == 98
+    np.testing.assert_array_equal(frame.points, expected_points)
+    np.testing.assert_array_equal(frame.intensity, expected_intensity)
+
+
+def test_mapped_frame_masks_lazily(tmp_path):
+    frame = map_binary(write_frame(tmp_path / "frame.bin", np.ones((10, 4))))
+
+    assert frame._mask is None
+    frame.points
+    assert frame._mask is not None
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from scripts.common.helper.point_cloud import calculate_range, calculate_xyz
+from scripts.common.helper.ri.ri_default_mapper import RangeImageDefaultMapper
+from scripts.common.helper.ri.ri_utils import SparseRangeImage, point_cloud_to_range_image, range_image_round_trips, \
+    range_image_to_point_cloud
+
+
+def synthetic_cloud(points_count=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    theta = rng.uniform(-np.pi, np.pi, points_count)
+    phi = rng.uniform(np.deg2rad(-25), np.deg2rad(3), points_count)
+    r = rng.uniform(2, 80, points_count)
+
+    return calculate_xyz(phi, theta, r).astype(np.float32)
+
+
+def reference_range_image(ri_mapper, points):
+    # dense assignment from before the scatter, the last point written into a pixel wins
+    theta, phi = ri_mapper.map(points)
+    range_image = np.full((ri_mapper.h, ri_mapper.w), -1.0, dtype=np.float32)
+    range_image[phi, theta] = calculate_range(points)
+
+    return range_image
+
+
+def reference_point_cloud(ri_mapper, range_image):
+    # meshgrid unmap from before the cached trig tables
+    theta_values = np.linspace(-np.pi, np.pi, ri_mapper.w, endpoint=True)
+    phi_values = np.linspace(ri_mapper.min_phi, ri_mapper.max_phi, ri_mapper.h, endpoint=True)
+    theta, phi = (values.flatten() for values in np.meshgrid(theta_values, phi_values))
+    r = range_image.flatten()
+
+    valid = r > 0
+    return calculate_xyz(phi[valid], theta[valid], r[valid])
+
+
+@pytest.mark.parametrize("w, h", [(1024, 64), (4096, 256), (32768, 2048)])
+def test_range_image_to_point_cloud_matches_reference(w, h):
+    points = synthetic_cloud()
+    ri_mapper = RangeImageDefaultMapper(w, h)
+    range_image = point_cloud_to_range_image(ri_mapper, points)
+
+    expected = reference_point_cloud(ri_mapper, reference_range_image(RangeImageDefaultMapper(w, h), points))
+
+    np.testing.assert_array_equal(range_image_to_point_cloud(ri_mapper, range_image), expected)
+
+
+def test_range_image_round_trips_match_reference():
+    points = synthetic_cloud()
+    ri_mappers = [RangeImageDefaultMapper(1024 * m, 64 * m) for m in [1, 2, 4, 8]]
+
+    for ri_mapper, reconstructed in zip(ri_mappers, range_image_round_trips(ri_mappers, points)):
+        reference_mapper = RangeImageDefaultMapper(ri_mapper.w, ri_mapper.h)
+        expected = reference_point_cloud(reference_mapper, reference_range_image(reference_mapper, points))
+
+        np.testing.assert_array_equal(reconstructed, expected)
+
+
+def test_point_cloud_to_range_image_picks_sparse_from_occupancy():
+    points = synthetic_cloud(points_count=1000)
+    small_mapper, large_mapper = RangeImageDefaultMapper(64, 8), RangeImageDefaultMapper(32768, 2048)
+
+    assert isinstance(point_cloud_to_range_image(small_mapper, points), np.ndarray)
+    assert isinstance(point_cloud_to_range_image(large_mapper, points), SparseRangeImage)
+    assert isinstance(point_cloud_to_range_image(large_mapper, points, sparse=False), np.ndarray)
+    assert isinstance(point_cloud_to_range_image(small_mapper, points, sparse=True), SparseRangeImage)
+
+
+def test_sparse_range_image_matches_dense():
+    points = synthetic_cloud(points_count=100)
+    ri_mapper = RangeImageDefaultMapper(32768, 2048)
+
+    range_image = point_cloud_to_range_image(ri_mapper, points, sparse=False)
+
+    np.testing.assert_array_equal(range_image, reference_range_image(RangeImageDefaultMapper(32768, 2048), points))
+    np.testing.assert_array_equal(point_cloud_to_range_image(ri_mapper, points, sparse=True).to_dense(), range_image)
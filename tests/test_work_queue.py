@@ -0,0 +1,75 @@
+import os
+import time
+
+import pytest
+
+from scripts.common.helper.work_queue import FailedChunksError, FrameQueue, LeaseLostError, MAX_ATTEMPTS
+
+
+FRAME_IDS = list(range(10))
+
+
+def claim_all(queue: FrameQueue) -> list[int]:
+    processed = []
+    for chunk in queue.claim_chunks():
+        processed.extend(chunk.frame_ids)
+        chunk.renew()
+        chunk.complete()
+
+    return processed
+
+
+def write_lease(queue_dir, index, token, attempt=1, age=0):
+    lease_path = os.path.join(queue_dir, f"{index}.lease")
+    with open(lease_path, "w") as f:
+        f.write(f"{token} {attempt}")
+    os.utime(lease_path, (time.time() - age, time.time() - age))
+
+
+def test_every_frame_is_claimed_once(tmp_path):
+    queue_dir = str(tmp_path)
+    processed = claim_all(FrameQueue(queue_dir, 0, FRAME_IDS, chunk_size=3))
+    processed += claim_all(FrameQueue(queue_dir, 1, FRAME_IDS, chunk_size=3))
+
+    assert sorted(processed) == FRAME_IDS
+
+
+def test_lease_of_a_previous_run_of_the_task_is_taken_over_at_once(tmp_path):
+    queue_dir = str(tmp_path)
+    queue = FrameQueue(queue_dir, 0, FRAME_IDS, chunk_size=3, lease_seconds=3600)
+    write_lease(queue_dir, 1, "0:node:1")
+
+    start = time.time()
+    assert sorted(claim_all(queue)) == FRAME_IDS
+    assert time.time() - start < 1
+
+
+def test_chunks_leased_by_another_task_are_waited_for_until_they_expire(tmp_path):
+    queue_dir = str(tmp_path)
+    queue = FrameQueue(queue_dir, 0, FRAME_IDS, chunk_size=3, lease_seconds=1)
+    write_lease(queue_dir, 2, "1:node:1")
+
+    assert sorted(claim_all(queue)) == FRAME_IDS
+
+
+def test_complete_fails_if_the_chunk_was_taken_over(tmp_path):
+    queue_dir = str(tmp_path)
+    chunk = next(FrameQueue(queue_dir, 0, FRAME_IDS, chunk_size=3).claim_chunks())
+    write_lease(queue_dir, chunk.index, "1:node:1", attempt=2)
+
+    with pytest.raises(LeaseLostError):
+        chunk.complete()
+
+    assert os.path.exists(os.path.join(queue_dir, f"{chunk.index}.lease"))
+    assert not os.path.exists(chunk.done_path)
+
+
+def test_failed_chunks_fail_the_task_and_are_retried_on_rerun(tmp_path):
+    queue_dir = str(tmp_path)
+    queue = FrameQueue(queue_dir, 0, FRAME_IDS, chunk_size=3, lease_seconds=1)
+    write_lease(queue_dir, 0, "1:node:1", attempt=MAX_ATTEMPTS, age=10)
+
+    with pytest.raises(FailedChunksError):
+        claim_all(queue)
+
+    assert sorted(claim_all(FrameQueue(queue_dir, 0, FRAME_IDS, chunk_size=3))) == FRAME_IDS